@@ -0,0 +1,45 @@
+# Benchmark harness; run it via `python -m bench` from the repository root (see bench/__main__.py for options)
+
+import gc
+import os
+import platform
+import statistics
+import sys
+import time
+
+
+# Calls func repeatedly (at least once) for min_time seconds and returns calls per second
+def ops_per_sec(func, min_time=1.0):
+    count, start = 0, time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time: return count / elapsed
+
+
+# A warm-up round (caches, lazily built tables, first-call allocation) that is not timed, then repeats timed rounds
+#   of min_time each; returns the median and the best ops/s, which are far steadier across runs than a single round
+def measure(func, min_time=1.0, repeats=5):
+    ops_per_sec(func, min_time / 2)
+    gc.collect()  # Start from a clean heap so an earlier case's garbage is not collected on this one's clock
+    rounds = sorted(ops_per_sec(func, min_time) for _i in range(repeats))
+    return {'median': statistics.median(rounds), 'best': rounds[-1]}
+
+
+def machine_info():
+    return {'python': sys.version.split()[0], 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpus': os.cpu_count()}
+
+
+# Returns (name, baseline ops/s, current ops/s, ratio) for every benchmark in both runs, plus the names whose ratio
+#   fell below 1 - tolerance; results and baseline map names to measure() output, compared on the given statistic
+def compare(results, baseline, tolerance, statistic='best'):
+    rows, regressions = [], []
+    for (name, current) in results.items():
+        if name not in baseline: continue
+        ratio = current[statistic] / baseline[name][statistic]
+        rows.append((name, baseline[name][statistic], current[statistic], ratio))
+        if ratio < 1 - tolerance: regressions.append(name)
+    return rows, regressions
@@ -0,0 +1,49 @@
+# Runs the benchmark cases and emits JSON: {"machine": {...}, "results": {name: {"median": ops/s, "best": ops/s}}}
+#   python -m bench [--groups fields,curves,poly,qap,ipa] [--max-log-size 14] [--min-time 1.0] [--repeats 5]
+#                   [--output results.json] [--baseline baseline.json] [--tolerance 0.1] [--statistic best]
+#   Each case gets an untimed warm-up, then --repeats rounds of --min-time seconds. With --baseline, a comparison
+#   on the chosen statistic is printed to stderr and the exit status is 1 if any benchmark slowed down by more than
+#   the tolerance, so the run can gate a deployment
+
+import argparse
+import json
+import random
+import sys
+
+from bench import compare, machine_info, measure
+from bench.cases import GROUPS
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    parser.add_argument('--groups', default=','.join(GROUPS))
+    parser.add_argument('--max-log-size', type=int, default=14)
+    parser.add_argument('--min-time', type=float, default=1.0)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--statistic', choices=['best', 'median'], default='best')
+    args = parser.parse_args()
+
+    random.seed(11)  # Same inputs on every run
+    results = dict()
+    for group in args.groups.split(','):
+        for (name, func) in GROUPS[group](args.max_log_size):
+            results[name] = measure(func, args.min_time, args.repeats)
+            print(f'{name:40} {results[name]["median"]:14.3f} ops/s median {results[name]["best"]:14.3f} best',
+                  file=sys.stderr)
+
+    report = json.dumps({'machine': machine_info(), 'results': results}, indent=2)
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, 'w') as file: file.write(report + '\n')
+
+    if args.baseline is not None:
+        with open(args.baseline) as file: baseline = json.load(file)['results']
+        rows, regressions = compare(results, baseline, args.tolerance, args.statistic)
+        for (name, old, new, ratio) in rows:
+            print(f'{name:40} {old:14.3f} -> {new:14.3f} ops/s  x{ratio:5.2f}'
+                  f'{"  REGRESSION" if name in regressions else ""}', file=sys.stderr)
+        if regressions: sys.exit(1)
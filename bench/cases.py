@@ -0,0 +1,106 @@
+# Benchmark cases; each group returns a list of (name, callable) with all inputs prepared up front
+
+from random import randint
+
+import ipa
+from curves import Pallas
+from fields import Fp, Fq
+from main import commit, setup
+from msm import msm
+from ntt import Domain
+from poly import Poly
+from r1cs_qap import R1csQap
+
+
+def rnd_fp():
+    return Fp(randint(0, Fp.modulus - 1))
+
+
+def rnd_fq():
+    return Fq(randint(0, Fq.modulus - 1))
+
+
+def fields_cases(max_log_size):
+    x, y = rnd_fp(), rnd_fp()
+    square = x * x
+    elements = [rnd_fp() for _i in range(256)]
+    return [('fields.fp_mul', lambda: x * y),
+            ('fields.fp_inv', lambda: x.inv0()),
+            ('fields.fp_sqrt', lambda: square.sqrt()),
+            ('fields.fp_batch_inv_256', lambda: Fp.batch_inv(elements)),
+            ('fields.hash_to_field', lambda: Fp.hash_to_field(b'bench', b'message'))]
+
+
+def curves_cases(max_log_size):
+    p1 = Pallas.base() * rnd_fq()
+    p2 = Pallas.base() * rnd_fq()
+    scalar = rnd_fq()
+    result = [('curves.pallas_add', lambda: p1 + p2),
+              ('curves.pallas_double', lambda: p1.double()),
+              ('curves.pallas_mul', lambda: p1 * scalar),
+              ('curves.pallas_mul_fixed_base', lambda: Pallas.base() * scalar),
+              ('curves.pallas_hash_to_curve', lambda: Pallas.hash_to_curve(b'message'))]
+    for log_size in range(4, min(max_log_size, 10) + 1, 2):
+        points = [p1 * rnd_fq() for _i in range(2 ** log_size)]
+        scalars = [rnd_fq() for _i in range(2 ** log_size)]
+        result.append((f'curves.pallas_msm_2^{log_size}', lambda p=points, s=scalars: msm(p, s)))
+    return result
+
+
+def poly_cases(max_log_size):
+    result = []
+    for log_size in range(4, max_log_size + 1, 2):
+        size = 2 ** log_size
+        p1 = Poly([rnd_fp() for _i in range(size)])
+        p2 = Poly([rnd_fp() for _i in range(size)])
+        product = p1 * p2
+        domain = Domain(Fp, size)
+        evals = p1.evaluate_over(domain)
+        points = [rnd_fp() for _i in range(size)]
+        result += [(f'poly.mul_2^{log_size}', lambda a=p1, b=p2: a * b),
+                   (f'poly.div_2^{log_size}', lambda a=product, b=p2: a / b),
+                   (f'poly.interp_2^{log_size}', lambda e=evals: e.interpolate())]
+        if log_size <= 10:  # Arbitrary points are far slower than the NTT domain
+            result += [(f'poly.eval_many_2^{log_size}', lambda a=p1, x=points: a.eval_many(x)),
+                       (f'poly.interp_from_2^{log_size}', lambda x=points, e=evals: Poly.interpolate_from(x, e.values))]
+    return result
+
+
+# A chain of squarings w_(i+1) = w_i * w_i: one gate and one new wire per step
+def qap_cases(max_log_size):
+    result = []
+    for log_size in range(4, min(max_log_size, 8) + 1, 2):
+        size = 2 ** log_size
+        names = ['one'] + [f'w{i}' for i in range(size + 1)]
+        soln = [Fp(1), Fp(3)]
+        for _i in range(size): soln.append(soln[-1] * soln[-1])
+
+        def run(size=size, names=names, soln=soln):
+            gates = R1csQap(names)
+            for i in range(size): gates.append_gate([(f'w{i}', 1)], [(f'w{i}', 1)], [(f'w{i + 1}', 1)])
+            gates.transpose()
+            gates.gen_polys()
+            gates.gen_t(soln)
+            gates.gen_z()
+            gates.gen_h()
+        result.append((f'qap.end_to_end_2^{log_size}', run))
+    return result
+
+
+def ipa_cases(max_log_size):
+    result = []
+    for log_size in range(4, min(max_log_size, 8) + 1, 2):
+        crs = setup(2 ** log_size, label=b'zero11-bench')
+        coeffs = [rnd_fq() for _i in range(2 ** log_size)]
+        r, x = rnd_fq(), rnd_fq()
+        commitment = commit(crs, coeffs, r)
+        v = Poly(list(coeffs)).eval(x)
+        proof = ipa.prove(crs, commitment, coeffs, r, x)
+        result += [(f'ipa.commit_2^{log_size}', lambda c=crs, a=coeffs, r=r: commit(c, a, r)),
+                   (f'ipa.prove_2^{log_size}',
+                    lambda c=crs, p=commitment, a=coeffs, r=r, x=x: ipa.prove(c, p, a, r, x)),
+                   (f'ipa.verify_2^{log_size}', lambda c=crs, p=commitment, x=x, v=v, pr=proof: ipa.verify(c, p, x, v, pr))]
+    return result
+
+
+GROUPS = {'fields': fields_cases, 'curves': curves_cases, 'poly': poly_cases, 'qap': qap_cases, 'ipa': ipa_cases}
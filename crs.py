@@ -0,0 +1,125 @@
+# This code implements deterministic CRS derivation and a memory-mapped on-disk cache of compressed Pallas points
+
+import mmap
+import os
+from collections import namedtuple
+from hashlib import blake2b
+
+from curves import Pallas
+
+Crs = namedtuple("Crs", "g h")
+
+# File layout (integers little-endian):
+#   magic (6) | version (2) | size (4) | label length (2) | label | blake2b-256 checksum (32) | points (32 each)
+#   The points are h followed by g[0..size-1]; the checksum covers everything before it plus the points
+MAGIC = b'Z11CRS'
+VERSION = 1
+POINT_SIZE = 32
+
+
+# g[i] and h are hashed to the curve under the label, so every party derives the same CRS from the label alone;
+#   workers is passed on to hash_to_curve_many
+def derive(size, label, workers=None):
+    messages = [b'h'] + [b'g' + i.to_bytes(8, byteorder='little') for i in range(size)]
+    points = Pallas.hash_to_curve_many(messages, domain_prefix=label, workers=workers)
+    return Crs(g=points[1:], h=points[0])
+
+
+# Read-only sequence over the encoded points of a mapped file; each point is decoded on first access, then kept
+class LazyPoints:
+    def __init__(self, buffer, offset, count):
+        self.buffer, self.offset, self.count = buffer, offset, count
+        self.decoded = [None] * count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step == 1 and all(pt is None for pt in self.decoded[start:stop]):  # Decode straight from the map
+                self.decoded[start:stop] = Pallas.decode_many(self.buffer, self.offset + start * POINT_SIZE,
+                                                              max(0, stop - start))
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0: index += self.count
+        if not 0 <= index < self.count: raise IndexError('point index out of range')
+        if self.decoded[index] is None:
+            start = self.offset + index * POINT_SIZE
+            self.decoded[index] = Pallas.from_bytes(self.buffer[start:start + POINT_SIZE])
+        return self.decoded[index]
+
+    def __iter__(self):
+        return iter(self[0:self.count])
+
+
+def header(size, label):
+    return MAGIC + VERSION.to_bytes(2, byteorder='little') + size.to_bytes(4, byteorder='little') + \
+        len(label).to_bytes(2, byteorder='little') + label
+
+
+def save(crs, path, label):
+    prefix = header(len(crs.g), label)
+    body = Pallas.encode_many([crs.h] + list(crs.g))
+    checksum = blake2b(prefix + body, digest_size=32).digest()
+    temp_path = f'{path}.tmp{os.getpid()}'
+    with open(temp_path, 'wb') as file:
+        file.write(prefix + checksum + body)
+    os.replace(temp_path, path)  # Readers never observe a partially written file
+
+
+# Maps the file and checks its header and checksum; points are decoded lazily as they are used
+def load(path):
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    if len(view) < 14 or bytes(view[0:6]) != MAGIC: raise ValueError('not a CRS file')
+    if int.from_bytes(view[6:8], byteorder='little') != VERSION: raise ValueError('unsupported CRS file version')
+    size = int.from_bytes(view[8:12], byteorder='little')
+    label_end = 14 + int.from_bytes(view[12:14], byteorder='little')
+    body_start = label_end + 32
+    if len(view) != body_start + (size + 1) * POINT_SIZE: raise ValueError('truncated CRS file')
+    hasher = blake2b(view[0:label_end], digest_size=32)
+    hasher.update(view[body_start:])
+    if hasher.digest() != view[label_end:body_start]: raise ValueError('CRS file checksum mismatch')
+    h = Pallas.from_bytes(view[body_start:body_start + POINT_SIZE])
+    return bytes(view[14:label_end]), Crs(g=LazyPoints(view, body_start + POINT_SIZE, size), h=h)
+
+
+# Returns the CRS for (size, label) from the cache file, deriving and (re)writing it if missing, stale or corrupt
+def load_or_derive(size, label, path, workers=None):
+    try:
+        cached_label, crs = load(path)
+        if cached_label == label and len(crs.g) == size: return crs
+    except (OSError, ValueError):
+        pass
+    crs = derive(size, label, workers)
+    save(crs, path, label)
+    return crs
+
+
+if __name__ == '__main__':
+    print("Starting crs.py quick self-test")
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path1 = os.path.join(directory, 'crs.bin')
+        crs1 = load_or_derive(8, b'zero11-test', path1)
+        assert crs1 == derive(8, b'zero11-test')
+        label1, crs2 = load(path1)
+        assert label1 == b'zero11-test' and len(crs2.g) == 8
+        assert crs2.h == crs1.h and crs2.g[3] == crs1.g[3] and list(crs2.g) == crs1.g and crs2.g[-2:] == crs1.g[-2:]
+        assert load_or_derive(8, b'zero11-test', path1).g[5] == crs1.g[5]
+        assert load(path1)[1].g[2:6] == crs1.g[2:6] and list(load(path1)[1].g) == crs1.g
+
+        with open(path1, 'r+b') as file1:  # Corrupt one point; the cache must notice and regenerate
+            file1.seek(-1, os.SEEK_END)
+            file1.write(b'\x55')
+        try:
+            load(path1)
+            assert False
+        except ValueError:
+            pass
+        assert list(load_or_derive(8, b'zero11-test', path1).g) == crs1.g
+        assert len(load_or_derive(4, b'zero11-test', path1).g) == 4
+
+    print("Success.")
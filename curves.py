@@ -1,24 +1,92 @@
 # This code implements the Pallas and Vesta curves utilizing the Fp and Fq fields respectively
 
+import os
 import secrets
-from fields import Fp, Fq
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from fields import CHECKED, Fp, Fq, new
+
+
+# Fixed-base tables live on the points themselves; this bounds their combined size by evicting (dropping the table
+#   of) the least recently used point once the budget is exceeded
+class FixedBaseCache:
+    def __init__(self, budget):
+        self.budget = budget  # Maximum number of precomputed points held across all tables
+        self.size = 0
+        self.points = OrderedDict()  # id(point) -> (point, table size), least recently used first
+
+    # Registers the point's (new) table; a table the point already had registered no longer counts
+    def add(self, point):
+        if id(point) in self.points: self.size -= self.points.pop(id(point))[1]
+        table_size = sum(len(row) for row in point.table)
+        self.points[id(point)] = (point, table_size)
+        self.size += table_size
+        while self.size > self.budget and len(self.points) > 1:
+            _key, (evicted, evicted_size) = self.points.popitem(last=False)
+            self.size -= evicted_size
+            evicted.table = None
+
+    # A point carrying a table the cache does not know (e.g. a shallow copy sharing it) is registered here
+    def touch(self, point):
+        entry = self.points.get(id(point))
+        if entry is None or entry[0] is not point:
+            self.add(point)
+        else:
+            self.points.move_to_end(id(point))
+
+
+fixed_base_cache = FixedBaseCache(2 ** 16)
+PARALLEL_THRESHOLD = 256  # Below this many messages hash_to_curve_many() stays serial; pool start-up outweighs the gain
 
 
 # Curve is not meant to be used directly; it is subclassed for Pallas and Vesta
 class __Curve:
-    # Constants and neutral() are to be defined in specific Curve subclasses
-    iso_a = iso_b = iso_z = iso_vecs = a = b = None
+    # Projective co-ordinates as a tuple of ints in [0, modulus), and the fixed-base multiples (see precompute())
+    __slots__ = ('xyz', 'table')
+    # Constants and neutral() are to be defined in specific Curve subclasses; b3 is 3 * b as an int
+    iso_a = iso_b = iso_z = iso_vecs = a = b = b3 = field = None
+    zeta = glv_lambda = glv_basis = None  # GLV endomorphism constants, see mul_glv()
     def neutral(self): pass
 
     # We use projective co-ordinates
     def __init__(self, x, y, z):
-        assert type(x) is Fp or type(x) is Fq
-        assert type(x) is type(y) and type(y) is type(z)
-        self.x, self.y, self.z = x, y, z
+        assert type(x) is self.field and type(y) is self.field and type(z) is self.field
+        self.xyz = (x.value, y.value, z.value)
+        self.table = None
+
+    # Internal constructor from co-ordinates already reduced modulo the field's modulus; nothing is checked
+    @classmethod
+    def from_ints(cls, x, y, z):
+        pt = new(cls)
+        pt.xyz = (x, y, z)
+        pt.table = None
+        return pt
+
+    # Pickles and copies carry only the co-ordinates; a fixed-base table is local to the point it was built for
+    def __getstate__(self):
+        return self.xyz
+
+    def __setstate__(self, state):
+        self.xyz = state
+        self.table = None
+
+    # The co-ordinates as field elements
+    @property
+    def x(self):
+        return self.field.from_reduced(self.xyz[0])
+
+    @property
+    def y(self):
+        return self.field.from_reduced(self.xyz[1])
+
+    @property
+    def z(self):
+        return self.field.from_reduced(self.xyz[2])
 
     def __repr__(self):
-        if self.z == (type(self.z))(0): return "Neutral point"
-        return f'{self.__class__.__name__} x={self.x / self.z} y={self.y / self.z}'
+        if self.xyz[2] == 0: return "Neutral point"
+        pt = self.normalize()
+        return f'{self.__class__.__name__} x={pt.x} y={pt.y}'
 
     # See https://eprint.iacr.org/2015/1060.pdf page 8
     # Algorithm 1: Complete, projective point addition for arbitrary prime order short Weierstrass curves E/Fq : y^2 = x^3 + ax + b.
@@ -40,80 +108,232 @@ class __Curve:
 
 
     def __add__(self, other, a=None, b=None):  # a,b params only used when on isogeny curves
-        assert type(self) is type(other)
-        if a is None: a = self.a
-        b3 = type(self.x)(3) * (self.b if b is None else b)
-        x1, y1, z1 = self.x, self.y, self.z
-        x2, y2, z2 = other.x, other.y, other.z
-        m0 = x1 * x2
-        m1 = y1 * y2
-        m2 = z1 * z2
-        # a0 = x1 + y1
-        # a1 = x2 + y2
-        m3 = (x1 + y1) * (x2 + y2)
-        # a2 = m0 + m1
-        # a3 = m3 - (m0 + m1)
-        # a4 = x1 + z1
-        # a5 = x2 + z2
-        m4 = (x1 + z1) * (x2 + z2)
-        # a6 = m0 + m2
-        # a7 = m4 - (m0 + m2)
-        # a8 = y1 + z1
-        # a9 = y2 + z2
-        m5 = (y1 + z1) * (y2 + z2)
-        # a10 = m1 + m2
-        # a11 = m5 - (m1 + m2)
-        m6 = a * (- m0 - m2 + m4)  # m6 = a * (m4 - (m0 + m2))
-        m7 = b3 * m2
-        # a12 = m7 + m6
-        # a13 = m1 - (m7 + m6)
-        # a14 = m1 + (m7 + m6)
-        m8 = (m1 - m6 - m7) * (m1 + m6 + m7)  # m8 = (m1 - (m7 + m6)) * (m1 + (m7 + m6))
-        # a15 = m0 + m0
-        # a16 = (m0 + m0) + m0
-        m9 = a * m2
-        m10 = b3 * (- m0 - m2 + m4)  # m10 = b3 * (m4 - (m0 + m2))
-        # a17 = ((m0 + m0) + m0) + m9
-        # a18 = m0 - m9
-        m11 = a * (m0 - m9)
-        # a19 = m10 + m11
-        m12 = (m0 * 3 + m9) * (m10 + m11)  # m12 = (((m0 + m0) + m0) + m9) * (m10 + m11)
-        # a20 = m8 + m12
-        m13 = (- m1 - m2 + m5) * (m10 + m11)  # m13 = (m5 - (m1 + m2)) * (m10 + m11)
-        m14 = (- m0 - m1 + m3) * (m1 - m6 - m7)  # m14 = (m3 - (m0 + m1)) * (m1 - (m7 + m6))
-        # a21 = m14 - m13
-        m15 = (- m0 - m1 + m3) * (m0 * 3 + m9)  # m15 = (m3 - (m0 + m1)) * (((m0 + m0) + m0) + m9)
-        m16 = (- m1 - m2 + m5) * (m1 + m6 + m7)  # m16 = (m5 - (m1 + m2)) * (m1 + (m7 + m6))
-        # a22 = m16 + m15
-        z3_inv = (m15 + m16).inv0()
-        x3 = (- m13 + m14) * z3_inv
-        y3 = (m8 + m12) * z3_inv
-        z3 = (m15 + m16) * z3_inv
-        # return type(self)(a21, a20, a22)
-        return type(self)(x3, y3, z3)
+        if a is None and b is None: return self.add_a0(other)  # Pallas and Vesta both have a = 0
+        p = self.field.modulus
+        a = (self.a if a is None else a).value
+        b3 = 3 * (self.b if b is None else b).value % p
+        (x1, y1, z1), (x2, y2, z2) = self.xyz, other.xyz
+        m0 = x1 * x2 % p
+        m1 = y1 * y2 % p
+        m2 = z1 * z2 % p
+        m3 = (x1 + y1) * (x2 + y2) % p
+        m4 = (x1 + z1) * (x2 + z2) % p
+        m5 = (y1 + z1) * (y2 + z2) % p
+        m6 = a * (m4 - m0 - m2) % p
+        m7 = b3 * m2 % p
+        m8 = (m1 - m6 - m7) * (m1 + m6 + m7) % p
+        m9 = a * m2 % p
+        m10 = b3 * (m4 - m0 - m2) % p
+        m11 = a * (m0 - m9) % p
+        m12 = (m0 * 3 + m9) * (m10 + m11) % p
+        m13 = (m5 - m1 - m2) * (m10 + m11) % p
+        m14 = (m3 - m0 - m1) * (m1 - m6 - m7) % p
+        m15 = (m3 - m0 - m1) * (m0 * 3 + m9) % p
+        m16 = (m5 - m1 - m2) * (m1 + m6 + m7) % p
+        # Left projective; normalize() only when affine co-ordinates are needed
+        return self.from_ints((m14 - m13) % p, (m8 + m12) % p, (m15 + m16) % p)
+
+    # See https://eprint.iacr.org/2015/1060.pdf page 13
+    # Algorithm 7: Complete, projective point addition for prime order j-invariant 0 short Weierstrass curves E/Fq : y^2 = x^3 + b.
+    #   On ints, reducing after each product; sums and differences stay unreduced until the next product
+    def add_a0(self, other):
+        p, b3 = self.field.modulus, self.b3
+        (x1, y1, z1), (x2, y2, z2) = self.xyz, other.xyz
+        t0 = x1 * x2 % p;   t1 = y1 * y2 % p;   t2 = z1 * z2 % p
+        t3 = ((x1 + y1) * (x2 + y2) - t0 - t1) % p
+        t4 = ((y1 + z1) * (y2 + z2) - t1 - t2) % p
+        y3 = ((x1 + z1) * (x2 + z2) - t0 - t2) % p
+        t0 = t0 * 3;    t2 = b3 * t2 % p
+        z3 = t1 + t2;   t1 = t1 - t2;   y3 = b3 * y3 % p
+        return self.from_ints((t3 * t1 - t4 * y3) % p, (t1 * z3 + y3 * t0) % p, (z3 * t4 + t0 * t3) % p)
+
+    # See https://eprint.iacr.org/2015/1060.pdf page 13
+    # Algorithm 9: Exception-free point doubling for prime order j-invariant 0 short Weierstrass curves E/Fq : y^2 = x^3 + b.
+    def double(self):
+        p, b3 = self.field.modulus, self.b3
+        x, y, z = self.xyz
+        t0 = y * y % p; z3 = t0 * 8;    t1 = y * z % p
+        t2 = b3 * z * z % p
+        x3 = t2 * z3 % p;   y3 = t0 + t2;   z3 = t1 * z3 % p
+        t0 = t0 - t2 * 3
+        y3 = (t0 * y3 + x3) % p
+        x3 = t0 * (x * y % p) * 2 % p
+        return self.from_ints(x3, y3, z3)
 
     def __mul__(self, other):
         assert (type(self) is Pallas and type(other) is Fq) or \
                (type(self) is Vesta and type(other) is Fp)
+        if self.table is not None: return self.mul_fixed(other)
+        return self.mul_glv(other)
+
+    # Binary double-and-add, kept as the reference for the faster multiplications
+    def mul_double_add(self, other):
         result = self.neutral()
         scalar = other.value
         pp = self
         while scalar > 0:
             if scalar & 0x1 != 0: result = result + pp
             scalar = scalar >> 1
-            pp = pp + pp  # TODO: Is there an elegant way to optimize the 'last add' away?
+            if scalar > 0: pp = pp.double()  # Skip the wasted 'last double'
+        return result
+
+    # GLV: the endomorphism (x, y) -> (zeta * x, y) equals multiplication by glv_lambda, where zeta and glv_lambda
+    #   are cube roots of unity in the base and scalar fields. See https://www.iacr.org/archive/crypto2001/21390189.pdf
+    def endomorphism(self):
+        x, y, z = self.xyz
+        return self.from_ints(x * self.zeta.value % self.field.modulus, y, z)
+
+    # Splits k into (k1, k2) with k = k1 + k2 * glv_lambda mod order and |k1|, |k2| around 2**128, by rounding
+    #   against the short lattice basis (a1, b1), (a2, b2) of {(a, b) : a + b * glv_lambda = 0 mod order}
+    @classmethod
+    def glv_split(cls, k):
+        a1, b1, a2, b2 = cls.glv_basis
+        c1 = (2 * b2 * k + cls.order) // (2 * cls.order)  # round(b2 * k / order)
+        c2 = (-2 * b1 * k + cls.order) // (2 * cls.order)  # round(-b1 * k / order)
+        return k - c1 * a1 - c2 * a2, -c1 * b1 - c2 * b2
+
+    # k * P = k1 * P + k2 * endomorphism(P): both ~128-bit halves share one run of doublings
+    def mul_glv(self, other, width=5):
+        return self.mul_many([other], width)[0]
+
+    # Multiplies this point by every scalar, building the odd-multiples table (and its endomorphism image, which
+    #   costs one field multiplication per entry) once for all of them; each scalar then goes through GLV + wNAF
+    def mul_many(self, scalars, width=5):
+        assert all((type(self) is Pallas and type(k) is Fq) or (type(self) is Vesta and type(k) is Fp) for k in scalars)
+        table = self.odd_multiples(width)
+        table_endo = [pt.endomorphism() for pt in table]
+        table_neg, table_endo_neg = [-pt for pt in table], [-pt for pt in table_endo]
+        results = []
+        for scalar in scalars:
+            k1, k2 = self.glv_split(scalar.value)
+            results.append(self.interleave_wnaf([(table, table_neg, wnaf(k1, width)),
+                                                 (table_endo, table_endo_neg, wnaf(k2, width))]))
+        return results
+
+    # Width-w NAF without GLV: about 255 doublings and 255 / (w + 1) additions
+    def mul_wnaf(self, other, width=5):
+        assert (type(self) is Pallas and type(other) is Fq) or (type(self) is Vesta and type(other) is Fp)
+        table = self.odd_multiples(width)
+        return self.interleave_wnaf([(table, [-pt for pt in table], wnaf(other.value, width))])
+
+    # [P, 3P, 5P, ..., (2**(width-1) - 1) P], the table a width-w NAF digit indexes (digit d -> table[|d| // 2])
+    def odd_multiples(self, width):
+        twice = self.double()
+        result = [self]
+        for _i in range(2 ** (width - 2) - 1): result.append(result[-1] + twice)
+        return result
+
+    # Sum of naf-weighted multiples for each (table, negated table, naf) with the doublings shared (Straus/Shamir
+    #   interleaving)
+    def interleave_wnaf(self, pairs):
+        result = None
+        for index in range(max(len(naf) for (_t, _n, naf) in pairs) - 1, -1, -1):
+            if result is not None: result = result.double()
+            for (table, table_neg, naf) in pairs:
+                if index >= len(naf) or naf[index] == 0: continue
+                pt = table[naf[index] >> 1] if naf[index] > 0 else table_neg[(-naf[index]) >> 1]
+                result = pt if result is None else result + pt
+        return self.neutral() if result is None else result
+
+    # Fixed-base comb: table[i][d - 1] = d * 2**(window * i) * self, so a multiplication is one addition per window
+    #   See https://link.springer.com/content/pdf/10.1007/3-540-47555-9_18.pdf (Brickell et al. fixed-base windowing)
+    def precompute(self, window=4):
+        table, row_base = [], self
+        for _i in range((self.order.bit_length() + window - 1) // window):
+            row = [row_base]
+            for _j in range(2 ** window - 2): row.append(row[-1] + row_base)
+            table.append(row)
+            row_base = row[-1] + row_base
+        flat = type(self).batch_normalize([pt for row in table for pt in row])
+        self.table = [flat[i:i + len(table[0])] for i in range(0, len(flat), len(table[0]))]
+        fixed_base_cache.add(self)
+        return self
+
+    def mul_fixed(self, other):
+        fixed_base_cache.touch(self)
+        window = len(self.table[0]).bit_length()
+        mask = 2 ** window - 1
+        result = self.neutral()
+        scalar = other.value
+        for row in self.table:
+            if scalar & mask != 0: result = result + row[(scalar & mask) - 1]
+            scalar = scalar >> window
         return result
 
     def __eq__(self, other):
-        assert type(self) is type(other)
-        if self.z == (type(self.z))(0): return other.z == (type(other.z))(0)
-        if other.z == (type(other.z))(0): return False
-        return self.x / self.z == other.x / other.z and self.y / self.z == other.y / other.z
+        (x1, y1, z1), (x2, y2, z2) = self.xyz, other.xyz
+        if z1 == 0: return z2 == 0
+        if z2 == 0: return False
+        p = self.field.modulus
+        return (x1 * z2 - x2 * z1) % p == 0 and (y1 * z2 - y2 * z1) % p == 0  # No inversions
+
+    def __neg__(self):
+        x, y, z = self.xyz
+        return self.from_ints(x, self.field.modulus - y if y != 0 else 0, z)
+
+    def normalize(self):  # Returns the equivalent point with z = 1 (neutral point is returned as-is)
+        x, y, z = self.xyz
+        if z == 0: return self
+        p = self.field.modulus
+        z_inv = pow(z, p - 2, p)
+        return self.from_ints(x * z_inv % p, y * z_inv % p, 1)
+
+    @classmethod
+    def batch_normalize(cls, points):  # As normalize() for every point, sharing a single field inversion
+        if len(points) == 0: return []
+        p = cls.field.modulus
+        z_invs = cls.field.batch_inv([cls.field.from_reduced(pt.xyz[2]) for pt in points])
+        return [pt if pt.xyz[2] == 0 else cls.from_ints(pt.xyz[0] * z_inv.value % p, pt.xyz[1] * z_inv.value % p, 1)
+                for (pt, z_inv) in zip(points, z_invs)]
+
+    # Compressed encoding as in https://github.com/zcash/pasta_curves: 32 little-endian bytes of x with sgn0(y) in
+    #   the top bit (the modulus is below 2**254); the neutral point encodes as 32 zero bytes
+    def to_bytes(self):
+        if self.xyz[2] == 0: return bytes(32)
+        x, y, _z = self.normalize().xyz
+        return (x | ((y & 1) << 255)).to_bytes(32, byteorder='little')  # y & 1 is sgn0(y)
+
+    # Untrusted input: a wrong length, a non-canonical x (x >= modulus) or an x off the curve raises ValueError
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) != 32: raise ValueError('point encoding must be 32 bytes')
+        field = cls.field
+        value = int.from_bytes(data, byteorder='little')
+        if value == 0: return cls.neutral()
+        x, sign = value & (2 ** 255 - 1), value >> 255
+        if x >= field.modulus: raise ValueError('non-canonical point encoding')
+        y = (field(x) ** 3 + cls.b).sqrt_or_none()
+        if y is None: raise ValueError('point encoding is not on the curve')
+        if y.sgn0() != sign: y = -y
+        return cls.from_ints(x, y.value, 1)
+
+    # Encodes the points back to back into one buffer, sharing a single inversion for the normalization
+    @classmethod
+    def encode_many(cls, points):
+        result = bytearray(32 * len(points))
+        for (index, pt) in enumerate(cls.batch_normalize(points)):
+            x, y, z = pt.xyz
+            if z == 0: continue  # Neutral point stays all zero
+            result[32 * index:32 * (index + 1)] = (x | ((y & 1) << 255)).to_bytes(32, byteorder='little')
+        return bytes(result)
+
+    # Decodes count points (default: all) starting at offset from any bytes-like buffer, e.g. a mapped file;
+    #   slicing the memoryview does not copy, so only the ints and points themselves are allocated
+    @classmethod
+    def decode_many(cls, buffer, offset=0, count=None):
+        view = memoryview(buffer)
+        if count is None: count = (len(view) - offset) // 32
+        assert offset + 32 * count <= len(view)
+        return [cls.from_bytes(view[start:start + 32]) for start in range(offset, offset + 32 * count, 32)]
 
     # Code follows https://www.ietf.org/archive/id/draft-irtf-cfrg-hash-to-curve-13.html#name-encoding-byte-strings-to-el
     @classmethod
-    def hash_to_curve(cls, message):
-        e1, e2 = type(cls.b).hash_to_field(b'z.cash:test', message)  # TODO: pass from above?
+    def hash_to_curve(cls, message, domain_prefix=b'z.cash:test'):
+        return cls.map_to_curve(*cls.field.hash_to_field(domain_prefix, message))
+
+    # The hash_to_curve steps after hash_to_field: map both elements, add on the isogeny curve and map across
+    @classmethod
+    def map_to_curve(cls, e1, e2):
         q0 = cls.map_to_curve_simple_swu(e1)
         q1 = cls.map_to_curve_simple_swu(e2)
         r = q0.__add__(q1, a=cls.iso_a, b=cls.iso_b)
@@ -122,37 +342,59 @@ class __Curve:
         assert z.is_on_curve(a=cls.a, b=cls.b)
         return z
 
-    # Code follows https://www.ietf.org/archive/id/draft-irtf-cfrg-hash-to-curve-13.html#name-simplified-shallue-van-de-w
-    #  on isogeny curve
+    # hash_to_curve for each message, in order; from PARALLEL_THRESHOLD messages on, chunks fan out over a process
+    #   pool when workers > 1 (default: one per CPU), otherwise (or for a single chunk) this is a serial loop
+    @classmethod
+    def hash_to_curve_many(cls, messages, domain_prefix=b'z.cash:test', workers=None, chunk_size=None):
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        if chunk_size is None: chunk_size = max(16, -(-len(messages) // (4 * workers)))
+        if workers <= 1 or len(messages) < PARALLEL_THRESHOLD or len(messages) <= chunk_size:
+            return [cls.map_to_curve(e1, e2) for (e1, e2) in cls.field.hash_to_field_many(domain_prefix, messages)]
+        chunks = [messages[i:i + chunk_size] for i in range(0, len(messages), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(hash_to_curve_chunk, [cls.__name__] * len(chunks),
+                                   [domain_prefix] * len(chunks), chunks)  # map() keeps the input order
+            return [cls.from_ints(x, y, z) for chunk in results for (x, y, z) in chunk]
+
+    # Code follows https://www.ietf.org/archive/id/draft-irtf-cfrg-hash-to-curve-13.html#name-simplified-swu-method
+    #   (the optimized straight-line version) on the isogeny curve; step 25's x = x / tv4 is left to the projective
+    #   z co-ordinate, so there is no inversion and sqrt_ratio() does the one exponentiation
     @classmethod
     def map_to_curve_simple_swu(cls, u):
-        tv1 = (cls.iso_z ** 2 * u ** 4 + cls.iso_z * u ** 2).inv0()  # 1. tv1 = inv0(Z^2 * u^4 + Z * u^2)
-        x1 = ((-cls.iso_b) / cls.iso_a) * (type(u)(1) + tv1)  # 2.  x1 = (-B / A) * (1 + tv1)
-        if tv1 == type(u)(0): x1 = cls.iso_b / (cls.iso_z * cls.iso_a)  # 3.  If tv1 == 0, set x1 = B / (Z * A)
-        gx1 = x1 ** 3 + cls.iso_a * x1 + cls.iso_b  # 4. gx1 = x1^3 + A * x1 + B
-        x2 = cls.iso_z * u ** 2 * x1  # 5.  x2 = Z * u^2 * x1
-        gx2 = x2 ** 3 + cls.iso_a * x2 + cls.iso_b  # 6. gx2 = x2^3 + A * x2 + B
-        if gx1.is_square():  # 7.  If is_square(gx1), set x = x1 and y = sqrt(gx1)
-            x = x1
-            y = gx1.sqrt()
-        else:  # 8.  Else set x = x2 and y = sqrt(gx2)
-            x = x2
-            y = gx2.sqrt()
-        if u.sgn0 != y.sgn0: y = type(u)(0) - y  # 9.  If sgn0(u) != sgn0(y), set y = -y
-        return cls(x, y, type(cls.b)(1))  # 10. return (x, y) as projective point
+        field = type(u)
+        tv1 = u * u  # 1.  tv1 = u^2
+        tv1 = cls.iso_z * tv1  # 2.  tv1 = Z * tv1
+        tv2 = tv1 * tv1 + tv1  # 3-4.  tv2 = tv1^2 + tv1
+        tv3 = cls.iso_b * (tv2 + field(1))  # 5-6.  tv3 = B * (tv2 + 1)
+        tv4 = cls.iso_a * (-tv2 if tv2.value != 0 else cls.iso_z)  # 7-8.  tv4 = A * CMOV(Z, -tv2, tv2 != 0)
+        tv6 = tv4 * tv4  # 10. tv6 = tv4^2
+        tv2 = (tv3 * tv3 + cls.iso_a * tv6) * tv3  # 9, 11-13.  tv2 = (tv3^2 + A * tv6) * tv3
+        tv6 = tv6 * tv4  # 14. tv6 = tv6 * tv4
+        tv2 = tv2 + cls.iso_b * tv6  # 15-16. tv2 = tv2 + B * tv6, so gx1 = tv2 / tv6
+        is_gx1_square, y1 = tv2.sqrt_ratio(tv6, cls.iso_z)  # 18. (is_gx1_square, y1) = sqrt_ratio(tv2, tv6)
+        if is_gx1_square:  # 21-22. x = tv3, y = y1
+            x, y = tv3, y1
+        else:  # 17, 19-20. x = tv1 * tv3, y = tv1 * u * y1
+            x, y = tv1 * tv3, tv1 * u * y1
+        if u.sgn0() != y.sgn0(): y = -y  # 23-24. If sgn0(u) != sgn0(y), set y = -y
+        return cls(x, y * tv4, tv4)  # 25-26. (x / tv4, y) as the projective point (x : y * tv4 : tv4)
 
     def is_on_curve(self, a, b):
         return self.z * self.y ** 2 == self.x ** 3 + a * self.x * self.z ** 2 + b * self.z ** 3
 
+    # The rational maps evaluated on homogenized numerators and denominators (x = X / Z), so no division is needed:
+    #   x' = Nx / (Dx * Z) and y' = Y * Ny / (Z * Dy) share the projective denominator Dx * Z * Dy
     @classmethod
     def iso_map(cls, pt):
-        x = pt.x / pt.z
-        y = pt.y / pt.z
-        x_num = cls.iso_vecs[0] * x ** 3 + cls.iso_vecs[1] * x ** 2 + cls.iso_vecs[2] * x + cls.iso_vecs[3]
-        x_den = x ** 2 + cls.iso_vecs[4] * x + cls.iso_vecs[5]
-        y_num = cls.iso_vecs[6] * x ** 3 + cls.iso_vecs[7] * x ** 2 + cls.iso_vecs[8] * x + cls.iso_vecs[9]
-        y_den = x ** 3 + cls.iso_vecs[10] * x ** 2 + cls.iso_vecs[11] * x + cls.iso_vecs[12]
-        return type(pt)(x_num / x_den, (y * y_num) / y_den, Fp(1))
+        k = cls.iso_vecs
+        x, y, z = pt.x, pt.y, pt.z
+        xx, zz = x * x, z * z
+        xxx, xxz, xzz, zzz = xx * x, xx * z, x * zz, zz * z
+        x_num = k[0] * xxx + k[1] * xxz + k[2] * xzz + k[3] * zzz
+        x_den = xx + k[4] * x * z + k[5] * zz
+        y_num = k[6] * xxx + k[7] * xxz + k[8] * xzz + k[9] * zzz
+        y_den = xxx + k[10] * xxz + k[11] * xzz + k[12] * zzz
+        return type(pt)(x_num * y_den, y * y_num * x_den, x_den * z * y_den)
 
     @classmethod
     def rnd(cls):
@@ -163,9 +405,16 @@ class __Curve:
 
 # y**2 = x**3 + 5 over Fp
 class Pallas(__Curve):
+    __slots__ = ()
+    field = Fp
     a = Fp(0)
     b = Fp(5)
+    b3 = 15
     order = Fq.modulus
+    zeta = Fp(0x12ccca834acdba712caad5dc57aab1b01d1f8bd237ad31491dad5ebdfdfe4ab9)
+    glv_lambda = 0x06819a58283e528e511db4d81cf70f5a0fed467d47c033af2aa9d2e050aa0e4f
+    glv_basis = (0x49e69d1640f049157fcae1c700000001, -0x49e69d1640a899538cb1279300000000,
+                 0x49e69d1640a899538cb1279300000000, 0x93cd3a2c8198e2690c7c095a00000001)
     #     "iso-pallas",
     iso_a = Fp(0x18354a2eb0ea8c9c49be2d7258370742b74134581a27a59f92bb4b0b657a014b)
     iso_b = Fp(1265)
@@ -185,30 +434,89 @@ class Pallas(__Curve):
                 Fp(0x17033d3c60c68173573b3d7f7d681310d976bbfabbc5661d4d90ab820b12320a),
                 Fp(0x40000000000000000000000000000000224698fc094cf91b992d30ecfffffde5)]
 
+    base_point = None
+
     @staticmethod
-    def base():
-        return Pallas(Fp(1), Fp(0x248b4a5cf5ed6c83ac20560f9c8711ab92e13d27d60fb1aa7f5db6c93512d546),
-                      Fp(1))
+    def base():  # Shared instance carrying a fixed-base table, rebuilt if the cache evicted it
+        if Pallas.base_point is None or Pallas.base_point.table is None:
+            Pallas.base_point = Pallas(Fp(1), Fp(0x248b4a5cf5ed6c83ac20560f9c8711ab92e13d27d60fb1aa7f5db6c93512d546),
+                                       Fp(1)).precompute()
+        return Pallas.base_point
 
     @staticmethod
     def neutral():
-        return Pallas(Fp(0), Fp(1), Fp(0))
+        return Pallas.from_ints(0, 1, 0)
 
 
 # y**2 = x**3 + 5 over Fq
 class Vesta(__Curve):
+    __slots__ = ()
+    field = Fq
     a = Fq(0)
     b = Fq(5)
+    b3 = 15
     order = Fp.modulus
+    zeta = Fq(0x397e65a7d7c1ad71aee24b27e308f0a61259527ec1d4752e619d1840af55f1b1)
+    glv_lambda = 0x2d33357cb532458ed3552a23a8554e5005270d29d19fc7d27b7fd22f0201b547
+    glv_basis = (0x49e69d1640a899538cb1279300000001, -0x49e69d1640f049157fcae1c700000000,
+                 0x93cd3a2c8198e2690c7c095a00000001, 0x49e69d1640a899538cb1279300000001)
+
+    base_point = None
 
     @staticmethod
-    def base():
-        return Vesta(Fq(1), Fq(0x26bc999156dd5194ec49b1c551768ab375785e7ce00906d13e0361674fd8959f),
-                     Fq(1))
+    def base():  # Shared instance carrying a fixed-base table, rebuilt if the cache evicted it
+        if Vesta.base_point is None or Vesta.base_point.table is None:
+            Vesta.base_point = Vesta(Fq(1), Fq(0x26bc999156dd5194ec49b1c551768ab375785e7ce00906d13e0361674fd8959f),
+                                     Fq(1)).precompute()
+        return Vesta.base_point
 
     @staticmethod
     def neutral():
-        return Vesta(Fq(0), Fq(1), Fq(0))
+        return Vesta.from_ints(0, 1, 0)
+
+
+# Width-w non-adjacent form of k (k may be negative), least significant digit first: every non-zero digit is odd
+#   with |d| < 2**(width-1), and any width consecutive digits hold at most one non-zero
+#   See https://en.wikipedia.org/wiki/Elliptic_curve_point_multiplication#w-ary_non-adjacent_form_(wNAF)_method
+def wnaf(k, width):
+    digits = []
+    while k != 0:
+        if k & 1:
+            digit = k & (2 ** width - 1)
+            if digit >= 2 ** (width - 1): digit -= 2 ** width
+            k -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        k >>= 1
+    return digits
+
+
+# Worker side of hash_to_curve_many; points travel back as int tuples rather than pickled field objects
+def hash_to_curve_chunk(curve_name, domain_prefix, messages):
+    curve = {'Pallas': Pallas, 'Vesta': Vesta}[curve_name]
+    return [pt.xyz for pt in curve.hash_to_curve_many(messages, domain_prefix, workers=1)]
+
+
+# Debug mode wrappers: both points must be on the same curve, and from_ints() co-ordinates must be reduced
+def checked(cls):
+    def same_curve(method):
+        def wrapper(self, other, *args, **kwargs):
+            assert type(self) is type(other), f'{type(self).__name__} combined with {type(other).__name__}'
+            return method(self, other, *args, **kwargs)
+        return wrapper
+
+    def from_ints(method):
+        def wrapper(klass, x, y, z):
+            assert all(type(v) is int and 0 <= v < klass.field.modulus for v in (x, y, z))
+            return method(klass, x, y, z)
+        return classmethod(wrapper)
+
+    for name in ['__add__', 'add_a0', '__eq__']: setattr(cls, name, same_curve(cls.__dict__[name]))
+    cls.from_ints = from_ints(cls.__dict__['from_ints'].__func__)
+
+
+if CHECKED: checked(Pallas.__bases__[0])
 
 
 if __name__ == "__main__":
@@ -222,6 +530,12 @@ if __name__ == "__main__":
 
     assert Pallas.base() * Fq(Pallas.order) == Pallas.neutral()
 
+    for _i in range(10):
+        p1 = Pallas.base() * Fq(randint(2, Pallas.order - 1))
+        xx1 = Fq(randint(2, Pallas.order - 1))
+        assert p1 * xx1 == Pallas(p1.x, p1.y, p1.z).precompute(window=5) * xx1
+        assert Pallas.base() * xx1 == Pallas(Pallas.base().x, Pallas.base().y, Pallas.base().z) * xx1
+
     v1 = Vesta.neutral()
     for _i in range(100):
         v1 = v1 + Vesta.base()
@@ -247,15 +561,64 @@ if __name__ == "__main__":
         v3 = Vesta.base() * Fp(xx1 + xx2)
         assert v1 + v2 == v3
 
+    for (curve, scalar_field) in [(Pallas, Fq), (Vesta, Fp)]:
+        pt = curve.base() * scalar_field(randint(2, curve.order - 1))
+        assert pt.endomorphism() == pt.mul_double_add(scalar_field(curve.glv_lambda))
+        for xx1 in [0, 1, 2, curve.order - 1, curve.glv_lambda] + [randint(2, curve.order - 1) for _i in range(20)]:
+            k1, k2 = curve.glv_split(xx1)
+            assert (k1 + k2 * curve.glv_lambda - xx1) % curve.order == 0 and max(abs(k1), abs(k2)) < 2 ** 129
+            assert pt * scalar_field(xx1) == pt.mul_double_add(scalar_field(xx1))
+            assert pt.mul_wnaf(scalar_field(xx1), width=3) == pt.mul_double_add(scalar_field(xx1))
+        ks = [scalar_field(randint(0, curve.order - 1)) for _i in range(5)]
+        assert pt.mul_many(ks, width=4) == [pt.mul_double_add(k) for k in ks]
+        assert -pt + pt == curve.neutral() and -(-pt) == pt
+
+    for xx1 in [1, -1, 7, -7, 2 ** 100 + 3, -(2 ** 99 + 5), randint(0, Pallas.order)]:
+        naf = wnaf(xx1, 4)
+        assert sum(d * 2 ** i for (i, d) in enumerate(naf)) == xx1
+        assert all(d == 0 or (d & 1 and abs(d) < 8) for d in naf)
+        assert all(sum(1 for d in naf[i:i + 4] if d != 0) <= 1 for i in range(len(naf)))
+
+    pts = [Pallas.base() * Fq(randint(2, Pallas.order - 1)) for _i in range(10)] + [Pallas.neutral()]
+    normalized = Pallas.batch_normalize(pts)
+    assert normalized == pts and all(pt.z == Fp(1) for pt in normalized[:-1])
+    assert not hasattr(pts[0], '__dict__') and Pallas.from_ints(*pts[0].xyz) == pts[0]
+
+    import copy
+    import pickle
+    size1 = fixed_base_cache.size
+    pt1 = Pallas.base() * Fq(11)
+    pt1.precompute()
+    pt1.precompute()  # Re-precomputing replaces the table's share of the budget rather than adding to it
+    assert fixed_base_cache.size == size1 + sum(len(row) for row in pt1.table)
+    assert copy.copy(Pallas.base()) * Fq(3) == Pallas.base() * Fq(3) and copy.copy(pt1).table is None
+    assert pickle.loads(pickle.dumps(pt1)) == pt1 and pickle.loads(pickle.dumps(pt1)).table is None
+    pt2 = Pallas.from_ints(*pt1.xyz)
+    pt2.table = pt1.table  # Shares a table the cache never saw; touching it registers it
+    assert pt2 * Fq(5) == pt1 * Fq(5) and id(pt2) in fixed_base_cache.points
+    assert Pallas(pts[0].x, pts[0].y, pts[0].z) == pts[0] and -Pallas.neutral() == Pallas.neutral()
+    if CHECKED:
+        for operation in [lambda: pts[0] + Vesta.base(), lambda: Pallas.from_ints(Fp.modulus, 1, 1)]:
+            try:
+                operation()
+                raise RuntimeError('debug mode missed a check')
+            except AssertionError:
+                pass
+
     print("Testing hash-to-curve")
     tmp1, tmp2 = Fp.hash_to_field(b'z.cash:test', b'Trans rights now!')
-    qq0 = Pallas.map_to_curve_simple_swu(tmp1)
+    qq0 = Pallas.map_to_curve_simple_swu(tmp1).normalize()
     assert qq0.x == Fp(0x05c3482fe40155e152fdc0be06c4766b67a2b3d8d9bb64ee6137382879dc2160)
     assert qq0.y == Fp(0x3825fb730c259375175ff31b94dc36dcf031b13f3116bda725f1c98717739f1f)
-    qq1 = Pallas.map_to_curve_simple_swu(tmp2)
+    qq1 = Pallas.map_to_curve_simple_swu(tmp2).normalize()
     assert qq1.x == Fp(0x2c6e5aa1a88cd76c8a9d436438d2993244bf7704e4f322a86d0890bd6cee28ab)
     assert qq1.y == Fp(0x0b20c46efea44d15e4828808c86a72789d54328635ba4274d8e9b48d9654f65b)
 
+    for _i in range(50):  # Both sqrt_ratio branches, always on the isogeny curve with sgn0(y) = sgn0(u)
+        tmp3 = Fp.rnd()
+        qq2 = Pallas.map_to_curve_simple_swu(tmp3)
+        assert qq2.is_on_curve(a=Pallas.iso_a, b=Pallas.iso_b) and qq2.normalize().y.sgn0() == tmp3.sgn0()
+
     rr = qq0.__add__(qq1, a=Pallas.iso_a, b=Pallas.iso_b)
 
     assert rr == Pallas(Fp(0x3da8497a87f06e28b7983f044f5f93575daf4806e0735700ebd79184070bb58e),
@@ -272,4 +635,39 @@ if __name__ == "__main__":
     zz = Pallas.hash_to_curve(b'Trans rights now!')
     assert zz == z11
 
+    # An input for which the pre-sqrt_or_none code returned the wrong sign of y from map_to_curve_simple_swu (it
+    #   compared the bound methods u.sgn0 != y.sgn0); checked against a plain affine implementation of the draft
+    zz = Pallas.hash_to_curve(b'zero11-sign-\x00')
+    assert zz == Pallas(Fp(0x3ab9d4d1b899f74c28e033cd07d078e9b201054bcf5108b86abf3ee26f2b633c),
+                        Fp(0x28c734ec61b6e042b18f0b3d6b8e07e4b4e71d05f49d74b1059b818c9df19dc9), Fp(1))
+    assert zz != Pallas(Fp(0x2e9c4c2d183b952013b012353a3b2de39b8cf6e9081f4587c7fb0d42dacfbe97),
+                        Fp(0x133a1d631d7c2aec43a3333336b63bb8b4e1a8929195302be40b0961c9566ce7), Fp(1))
+
+    msgs = [bytes([i]) * i for i in range(40)]
+    assert Pallas.hash_to_curve_many(msgs, workers=2, chunk_size=7) == [Pallas.hash_to_curve(m) for m in msgs]
+    msgs = [i.to_bytes(2, byteorder='little') for i in range(PARALLEL_THRESHOLD)]  # Large enough to use the pool
+    serial = Pallas.hash_to_curve_many(msgs, workers=1)
+    assert Pallas.hash_to_curve_many(msgs, workers=2, chunk_size=100) == serial
+    assert serial[0:3] == [Pallas.hash_to_curve(m) for m in msgs[0:3]]
+    assert Pallas.hash_to_curve_many(msgs[0:3], workers=1) == [Pallas.hash_to_curve(m) for m in msgs[0:3]]
+
+    for pt in [zz, Pallas.neutral(), Pallas.base() * Fq(randint(2, Pallas.order - 1))]:
+        assert Pallas.from_bytes(pt.to_bytes()) == pt
+    bad_encodings = [(Pallas.base().x.value + Fp.modulus).to_bytes(32, byteorder='little'),  # Non-canonical x
+                     (2).to_bytes(32, byteorder='little'), bytes(31)]  # 2**3 + 5 is a non-square; short input
+    for encoding in bad_encodings:
+        try:
+            Pallas.from_bytes(encoding)
+            raise RuntimeError('invalid encoding accepted')
+        except ValueError:
+            pass
+    vv = Vesta.base() * Fp(randint(2, Vesta.order - 1))
+    assert Vesta.from_bytes(vv.to_bytes()) == vv
+
+    pts = [Pallas.base() * Fq(randint(2, Pallas.order - 1)) for _i in range(5)] + [Pallas.neutral(), zz]
+    encoded = Pallas.encode_many(pts)
+    assert encoded == b''.join(pt.to_bytes() for pt in pts)
+    assert Pallas.decode_many(encoded) == pts
+    assert Pallas.decode_many(b'\x07' + encoded, offset=33, count=2) == pts[1:3]
+
     print("Success.")
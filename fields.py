@@ -1,11 +1,19 @@
 # This code implements the Fp and Fq fields (and helper functions) for Vesta and Pallas respectively
 
+import os
 import secrets
+from functools import lru_cache
 from hashlib import blake2b
 
+# ZERO11_CHECKED=1 turns on debug mode: operand type checks on the arithmetic and range checks in the unchecked
+#   constructors (see checked() at the end of this file and of curves.py). The default fast path checks nothing
+CHECKED = os.environ.get('ZERO11_CHECKED', '') not in ('', '0')
+new = object.__new__
+
 
 # Field is not meant to be used directly; it is subclassed for Fp and Fq
 class __Field:
+    __slots__ = ('value',)  # No per-element __dict__
     # Constants are to be defined in specific Field subclasses
     modulus = c = s = q = None
 
@@ -13,62 +21,155 @@ class __Field:
         assert type(value) is int
         self.value = value % self.modulus
 
+    # Internal constructor for a value already in [0, modulus): no type check and no reduction
+    @classmethod
+    def from_reduced(cls, value):
+        element = new(cls)
+        element.value = value
+        return element
+
+    # The operators below build their results directly and assume both operands are of the same field
     def __add__(self, other):
-        assert type(self) is type(other)
-        return type(self)(self.value + other.value)
+        cls = self.__class__
+        value = self.value + other.value
+        element = new(cls)
+        element.value = value - cls.modulus if value >= cls.modulus else value
+        return element
 
     def __sub__(self, other):
-        assert type(self) is type(other)
-        return type(self)(self.value - other.value)
+        cls = self.__class__
+        value = self.value - other.value
+        element = new(cls)
+        element.value = value + cls.modulus if value < 0 else value
+        return element
 
     def __mul__(self, other):
-        if type(other) is int: return type(self)(self.value * other)
-        if type(self) is not type(other): return other.__mul__(self)
-        return type(self)(self.value * other.value)
+        cls = self.__class__
+        if other.__class__ is cls:
+            element = new(cls)
+            element.value = self.value * other.value % cls.modulus
+            return element
+        if type(other) is int: return cls(self.value * other)
+        return other.__mul__(self)  # E.g. scalar * point
 
     def __eq__(self, other):
-        assert type(self) is type(other)
         return self.value == other.value
 
     def __pow__(self, other):
         assert type(other) is int
-        return type(self)(pow(self.value, other, self.modulus))
+        element = new(self.__class__)
+        element.value = pow(self.value, other, self.modulus)
+        return element
 
     def __truediv__(self, other):
-        assert type(self) is type(other)
         return self * other.inv0()
 
     def __neg__(self):
-        return type(self)(0 - self.value)
+        element = new(self.__class__)
+        element.value = self.modulus - self.value if self.value != 0 else 0
+        return element
 
     def __repr__(self):
         return f'{self.__class__.__name__} v={hex(self.value)}'
 
     def inv0(self):  # Multiplicative inverse via Fermat's little theorem (0 -> 0)
-        return type(self)(pow(self.value, self.modulus - 2, self.modulus))
+        return self.from_reduced(pow(self.value, self.modulus - 2, self.modulus))
+
+    # Montgomery's trick: one inversion and 3(n-1) multiplications for n elements (0 -> 0, as with inv0)
+    @classmethod
+    def batch_inv(cls, elements):
+        prefix, acc = [], 1
+        for element in elements:
+            assert type(element) is cls
+            prefix.append(acc)
+            if element.value != 0: acc = (acc * element.value) % cls.modulus
+        acc_inv = pow(acc, cls.modulus - 2, cls.modulus)
+        result = [cls.from_reduced(0)] * len(elements)
+        for index in range(len(elements) - 1, -1, -1):
+            if elements[index].value == 0: continue
+            result[index] = cls.from_reduced(prefix[index] * acc_inv % cls.modulus)
+            acc_inv = (acc_inv * elements[index].value) % cls.modulus
+        return result
+
+    # Lazy reduction: Python ints cannot overflow, so raw products are summed and reduced once per result rather than
+    #   building a reduced element after every multiply and add
+    @classmethod
+    def sum_of_products(cls, left, right):  # sum(left[i] * right[i])
+        return cls.from_reduced(sum([x.value * y.value for (x, y) in zip(left, right)]) % cls.modulus)
+
+    @classmethod
+    def convolve(cls, left, right):  # Coefficients of the product of the polynomials with coefficients left and right
+        right_values = [y.value for y in right]
+        acc = [0] * (len(left) + len(right) - 1)
+        for (i, x) in enumerate(left):
+            x = x.value
+            if x == 0: continue
+            acc[i:i + len(right_values)] = [a + x * y for (a, y) in zip(acc[i:i + len(right_values)], right_values)]
+        return [cls.from_reduced(a % cls.modulus) for a in acc]
 
     def is_square(self):
         legendre_symbol = self ** ((self.modulus - 1) // 2)
-        return legendre_symbol == type(self)(0) or legendre_symbol == type(self)(1)
+        return legendre_symbol.value == 0 or legendre_symbol.value == 1
 
-    # Tonelli-Shanks, see https://en.wikipedia.org/wiki/Tonelli%E2%80%93Shanks_algorithm
+    # Square root of a square; a table-driven variant of Tonelli-Shanks, for which see
+    #   https://en.wikipedia.org/wiki/Tonelli%E2%80%93Shanks_algorithm
     #   and/or https://www.diva-portal.org/smash/get/diva2:1581080/FULLTEXT01.pdf
     def sqrt(self):
-        assert self.is_square()
-        m, c, i = self.s, self.c, 0
-        t = pow(self.value, self.q, self.modulus)
-        r = pow(self.value, (self.q + 1) // 2, self.modulus)
-        while True:
-            if t == 1: return type(self)(r)
-            tc = t
-            for i in range(m):
-                if tc == 1: break
-                tc = (tc * tc) % self.modulus
-            b = pow(c, 2 ** (m - i - 1), self.modulus)
-            m = i
-            c = pow(b, 2, self.modulus)
-            t = (t * c) % self.modulus
-            r = (r * b) % self.modulus
+        result = self.sqrt_or_none()
+        assert result is not None
+        return result
+
+    # Square root, or None for a non-square, from a single exponentiation w = x^((q-1)/2): r = x * w = x^((q+1)/2)
+    #   and t = r * w = x^q = c^e for some e < 2^s. x is a square exactly when e is even, and then
+    #   sqrt(x) = r * c^(-e/2)
+    def sqrt_or_none(self):
+        if self.value == 0: return self.from_reduced(0)
+        modulus = self.modulus
+        w = pow(self.value, (self.q - 1) // 2, modulus)
+        r = (self.value * w) % modulus
+        e = self.root_log((r * w) % modulus)
+        if e & 1: return None
+        return self.from_reduced(r * self.root_pow_inv(e >> 1) % modulus)
+
+    # Returns (True, sqrt(self / v)) when self / v is a square, else (False, sqrt(z * self / v)) for the non-square z,
+    #   with no inversion and one large exponentiation; the exponents fold 1/v in as in
+    #   https://www.ietf.org/archive/id/draft-irtf-cfrg-hash-to-curve-13.html#name-sqrt_ratio-for-any-field
+    #   while the square root itself comes from the root_log() tables rather than the draft's loop
+    def sqrt_ratio(self, v, z):
+        assert type(self) is type(v) and type(self) is type(z) and v.value != 0
+        if self.value == 0: return True, self.from_reduced(0)
+        modulus, u, v = self.modulus, self.value, v.value
+        tv2 = pow(v, 2 ** self.s - 1, modulus)
+        tv3 = (tv2 * tv2 * v) % modulus
+        tv5 = (pow(u * tv3, (self.q - 1) // 2, modulus) * tv2) % modulus  # x^((q-1)/2) / v for x = u / v
+        r = (tv5 * u) % modulus  # x^((q+1)/2)
+        e = self.root_log((r * tv5 * v) % modulus)  # x^q = c^e
+        if e & 1 == 0: return True, self.from_reduced(r * self.root_pow_inv(e >> 1) % modulus)
+        z_q, z_q1, z_log = ratio_constants(type(self), z.value)  # (z * x)^q = z^q * c^e with z^q = c^z_log
+        e = (e + z_log) % 2 ** self.s
+        return False, self.from_reduced(r * z_q1 * self.root_pow_inv(e >> 1) % modulus)
+
+    # e with t = c^e, for t a 2^s-th root of unity; recovered window by window with table lookups instead of
+    #   Tonelli-Shanks' repeated squaring loops. See https://eprint.iacr.org/2020/1407.pdf (Sarkar) and
+    #   Bernstein's table method
+    @classmethod
+    def root_log(cls, t):
+        modulus, window = cls.modulus, SQRT_WINDOW
+        e = 0
+        for k in range(cls.s // window):
+            tk = t  # t * c^(-(low k windows of e))
+            for _i in range(cls.s - window * (k + 1)): tk = (tk * tk) % modulus
+            digit = cls.sqrt_log[tk]  # tk = (c^(2^(s-window)))^digit
+            e += digit << (window * k)
+            t = (t * cls.sqrt_inv[k][digit]) % modulus
+        return e
+
+    @classmethod
+    def root_pow_inv(cls, e):  # c^(-e) as an int, from the tables
+        result, mask = 1, 2 ** SQRT_WINDOW - 1
+        for k in range(cls.s // SQRT_WINDOW):
+            result = (result * cls.sqrt_inv[k][(e >> (SQRT_WINDOW * k)) & mask]) % cls.modulus
+        return result
 
     def sgn0(self):
         return self.value & 0x01  # The 'sign' of the field element
@@ -81,39 +182,108 @@ class __Field:
     # Code follows https://github.com/zcash/pasta_curves/blob/738fb60796d39b33f5b0a0337b8fabfcc81f98e1/src/hashtocurve.rs#L10-L77
     @classmethod
     def hash_to_field(cls, domain_prefix: bytes, message: bytes):
+        return cls.hash_to_field_many(domain_prefix, [message])[0]
+
+    # hash_to_field for each message; the zero block is absorbed once into a shared state that every message's
+    #   first hasher copies, and the suffix is built once per call
+    @classmethod
+    def hash_to_field_many(cls, domain_prefix: bytes, messages):
         curve_id = b'pallas' if cls == Fp else b'vesta'
         suffix = domain_prefix + b'-' + curve_id + b'_XMD:BLAKE2b_SSWU_RO_' + \
             bytes([22 + len(curve_id) + len(domain_prefix)])
-        hasher0 = blake2b(digest_size=64, person=b'\x00' * 16)
-        hasher0.update(b'\x00' * 128 + message + b'\x00\x80\x00' + suffix)
-        hasher1 = blake2b(digest_size=64, person=b'\x00' * 16)
-        hasher1.update(hasher0.digest() + b'\x01' + suffix)
-        hasher2 = blake2b(digest_size=64, person=b'\x00' * 16)
-        hasher2.update(bytes(a ^ b for (a, b) in zip(hasher0.digest(), hasher1.digest())))
-        hasher2.update(b'\x02' + suffix)
-        element0 = cls(int.from_bytes(hasher1.digest(), byteorder='big'))
-        element1 = cls(int.from_bytes(hasher2.digest(), byteorder='big'))
-        return element0, element1
+        tail0, tail1, tail2 = b'\x00\x80\x00' + suffix, b'\x01' + suffix, b'\x02' + suffix
+        result = []
+        for message in messages:
+            hasher0 = XMD_ZERO_STATE.copy()
+            hasher0.update(message)
+            hasher0.update(tail0)
+            b0 = hasher0.digest()
+            b1 = blake2b(b0 + tail1, digest_size=64, person=b'\x00' * 16).digest()
+            xored = (int.from_bytes(b0, byteorder='big') ^ int.from_bytes(b1, byteorder='big')).to_bytes(64, 'big')
+            b2 = blake2b(xored + tail2, digest_size=64, person=b'\x00' * 16).digest()
+            result.append((cls(int.from_bytes(b1, byteorder='big')), cls(int.from_bytes(b2, byteorder='big'))))
+        return result
 
     @classmethod
     def neutral(cls):
         return cls(0)
 
 
+XMD_ZERO_STATE = blake2b(b'\x00' * 128, digest_size=64, person=b'\x00' * 16)  # expand_message_xmd's Z_pad block
+
+SQRT_WINDOW = 8  # Bits of the discrete log recovered per table lookup in sqrt_or_none(); must divide s
+
+
+# Tables for sqrt_or_none(): log[h^j] = j for h = c^(2^(s-window)) of order 2^window, and
+#   inv[k][j] = c^(-j * 2^(window*k)) for every window position k
+def sqrt_tables(c, s, modulus):
+    assert s % SQRT_WINDOW == 0
+    h = pow(c, 2 ** (s - SQRT_WINDOW), modulus)
+    log, power = dict(), 1
+    for j in range(2 ** SQRT_WINDOW):
+        log[power] = j
+        power = (power * h) % modulus
+    inv, c_inv = [], pow(c, modulus - 2, modulus)
+    for k in range(s // SQRT_WINDOW):
+        base, row = pow(c_inv, 2 ** (SQRT_WINDOW * k), modulus), [1]
+        for _j in range(2 ** SQRT_WINDOW - 1): row.append((row[-1] * base) % modulus)
+        inv.append(row)
+    return log, inv
+
+
+# z^q, z^((q+1)/2) and the root_log of z^q for a non-square z, as used by sqrt_ratio()
+@lru_cache(maxsize=None)
+def ratio_constants(field, z):
+    z_q = pow(z, field.q, field.modulus)
+    return z_q, pow(z, (field.q + 1) // 2, field.modulus), field.root_log(z_q)
+
+
 class Fp(__Field):
+    __slots__ = ()
     s = 32  # write modulus = 2**s * q + 1 where q is odd
     q = 0x40000000000000000000000000000000224698fc094cf91b992d30ed
     modulus = 2 ** s * q + 1  # modulus = 1 mod 4, thus Tonelli-Shanks
     n = 5  # First non-square element
     c = pow(n, q, modulus)  # For sqrt()
+    sqrt_log, sqrt_inv = sqrt_tables(c, s, modulus)
 
 
 class Fq(__Field):
+    __slots__ = ()
     s = 32  # write modulus = 2**s * q + 1 where q is odd
     q = 0x40000000000000000000000000000000224698fc0994a8dd8c46eb21
     modulus = 2 ** s * q + 1  # modulus = 1 mod 4, thus Tonelli-Shanks
     n = 5  # First non-square element
     c = pow(n, q, modulus)  # For sqrt()
+    sqrt_log, sqrt_inv = sqrt_tables(c, s, modulus)
+
+
+# Debug mode wrappers: both operands must be elements of the same field, and from_reduced() values must be in range
+def checked(cls):
+    def same_field(method):
+        def wrapper(self, other, *args):
+            assert type(self) is type(other), f'{type(self).__name__} combined with {type(other).__name__}'
+            return method(self, other, *args)
+        return wrapper
+
+    def mul(method):
+        def wrapper(self, other):
+            assert type(other) is type(self) or type(other) is int or not isinstance(other, (Fp, Fq))
+            return method(self, other)
+        return wrapper
+
+    def from_reduced(method):
+        def wrapper(klass, value):
+            assert type(value) is int and 0 <= value < klass.modulus
+            return method(klass, value)
+        return classmethod(wrapper)
+
+    for name in ['__add__', '__sub__', '__eq__', '__truediv__']: setattr(cls, name, same_field(cls.__dict__[name]))
+    cls.__mul__ = mul(cls.__dict__['__mul__'])
+    cls.from_reduced = from_reduced(cls.__dict__['from_reduced'].__func__)
+
+
+if CHECKED: checked(Fp.__bases__[0])
 
 
 if __name__ == "__main__":
@@ -131,6 +301,11 @@ if __name__ == "__main__":
     zq2 = zq1 - Fq(1)
     assert zq2 == Fq(1)
 
+    elements = [Fp.rnd() for _i in range(20)] + [Fp(0)] + [Fp.rnd() for _i in range(5)]
+    assert Fp.batch_inv(elements) == [x.inv0() for x in elements]
+    assert Fq.batch_inv([Fq(2), Fq(0), Fq(4)]) == [Fq(2).inv0(), Fq(0), Fq(4).inv0()]
+    assert Fq.batch_inv([]) == []
+
     for _i in range(100):
         x = secrets.randbelow(Fp.modulus - 2)
         sqrt = (Fp(x) * Fp(x)).sqrt()
@@ -141,4 +316,35 @@ if __name__ == "__main__":
         sqrt = (Fq(x) * Fq(x)).sqrt()
         assert sqrt == Fq(x) or sqrt == Fq(-x)
 
+    for _i in range(100):
+        x = Fp.rnd()
+        assert (x.sqrt_or_none() is not None) == x.is_square()
+        assert x.sqrt_or_none() is None or x.sqrt_or_none() ** 2 == x
+    assert Fp(0).sqrt() == Fp(0) and Fq(Fq.n).sqrt_or_none() is None
+
+    for _i in range(100):
+        u, v = Fq.rnd(), Fq.rnd()
+        is_square, y = u.sqrt_ratio(v, Fq(Fq.n))
+        assert is_square == (u / v).is_square()
+        assert y * y == (u / v if is_square else Fq(Fq.n) * u / v)
+
+    assert not hasattr(Fp(3), '__dict__') and Fp.from_reduced(7) == Fp(7) and -Fp(0) == Fp(0) and -Fp(1) == Fp(-1)
+    assert Fp(5) - Fp(7) == Fp(-2) and Fp(-1) + Fp(2) == Fp(1) and Fp(3) * 4 == Fp(12)
+    if CHECKED:
+        for operation in [lambda: Fp(1) + Fq(1), lambda: Fp(1) * Fq(1), lambda: Fp.from_reduced(Fp.modulus)]:
+            try:
+                operation()
+                raise RuntimeError('debug mode missed a check')
+            except AssertionError:
+                pass
+
+    left1, right1 = [Fq.rnd() for _i in range(20)], [Fq.rnd() for _i in range(7)]
+    assert Fq.sum_of_products(left1, right1) == sum([x * y for (x, y) in zip(left1, right1)], Fq(0))
+    product1 = Fq.convolve(left1, right1)
+    assert len(product1) == 26 and product1[9] == sum([left1[9 - j] * right1[j] for j in range(7)], Fq(0))
+    assert Fq.convolve([Fq(0), Fq(2)], [Fq(3)]) == [Fq(0), Fq(6)] and Fq.sum_of_products([], []) == Fq(0)
+
+    hashed = Fq.hash_to_field_many(b'zero11-test', [b'a', b'', b'a'])
+    assert hashed[0] == hashed[2] == Fq.hash_to_field(b'zero11-test', b'a') and hashed[0] != hashed[1]
+
     print("Success.")
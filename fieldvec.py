@@ -0,0 +1,111 @@
+# This code implements FpVec and FqVec, vectors of field elements stored as a plain list of ints
+
+from fields import Fp, Fq
+from poly import Poly
+
+
+# FieldVec is not meant to be used directly; it is subclassed for FpVec and FqVec
+#   Additions and subtractions are left unreduced (ints may be negative or exceed the modulus) until a
+#   multiplication, dot product, comparison or conversion needs canonical values; Python ints cannot overflow
+class __FieldVec:
+    # Field is to be defined in specific FieldVec subclasses
+    field = None
+
+    def __init__(self, values, reduced=True):
+        assert isinstance(values, list) and (len(values) == 0 or type(values[0]) is int)
+        self.values = values
+        self.reduced = reduced
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} values={[hex(x) for x in self.reduce().values]}'
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): return type(self)(self.values[index], self.reduced)
+        return self.field(self.values[index])
+
+    def __eq__(self, other):
+        assert type(self) is type(other)
+        return self.reduce().values == other.reduce().values
+
+    def __add__(self, other):
+        assert type(self) is type(other) and len(self) == len(other)
+        return type(self)([x + y for (x, y) in zip(self.values, other.values)], reduced=False)
+
+    def __sub__(self, other):
+        assert type(self) is type(other) and len(self) == len(other)
+        return type(self)([x - y for (x, y) in zip(self.values, other.values)], reduced=False)
+
+    def __neg__(self):
+        return type(self)([-x for x in self.values], reduced=False)
+
+    def __mul__(self, other):  # Elementwise product, or scaling by a field element or int
+        modulus = self.field.modulus
+        if type(other) is int or type(other) is self.field:
+            scalar = other if type(other) is int else other.value
+            return type(self)([x * scalar % modulus for x in self.values])
+        assert type(self) is type(other) and len(self) == len(other)
+        return type(self)([x * y % modulus for (x, y) in zip(self.values, other.values)])
+
+    def dot(self, other):  # Sums the raw products and reduces once
+        assert type(self) is type(other) and len(self) == len(other)
+        return self.field(sum([x * y for (x, y) in zip(self.values, other.values)]))
+
+    def reduce(self):  # Brings every value back into [0, modulus), in place
+        if not self.reduced:
+            modulus = self.field.modulus
+            self.values = [x % modulus for x in self.values]
+            self.reduced = True
+        return self
+
+    @classmethod
+    def from_elements(cls, elements):
+        assert all(type(element) is cls.field for element in elements)
+        return cls([element.value for element in elements])
+
+    def to_elements(self):
+        return [self.field.from_reduced(x) for x in self.reduce().values]
+
+    @classmethod
+    def from_poly(cls, poly):
+        return cls.from_elements(poly.coeffs)
+
+    def to_poly(self):
+        return Poly(Poly.trim_leading_0s(self.to_elements()))
+
+    @classmethod
+    def zeros(cls, length):
+        return cls([0] * length)
+
+
+class FpVec(__FieldVec):
+    field = Fp
+
+
+class FqVec(__FieldVec):
+    field = Fq
+
+
+if __name__ == "__main__":
+    print("Starting fieldvec.py quick self-test")
+    from random import randint
+
+    left = [Fp(randint(0, Fp.modulus - 1)) for _i in range(50)]
+    right = [Fp(randint(0, Fp.modulus - 1)) for _i in range(50)]
+    v1, v2 = FpVec.from_elements(left), FpVec.from_elements(right)
+    assert (v1 + v2).to_elements() == [x + y for (x, y) in zip(left, right)]
+    assert (v1 - v2 - v2 + v1).to_elements() == [x - y - y + x for (x, y) in zip(left, right)]
+    assert (v1 * v2).to_elements() == [x * y for (x, y) in zip(left, right)]
+    assert ((v1 - v2) * v2).to_elements() == [(x - y) * y for (x, y) in zip(left, right)]
+    assert (v1 * Fp(7)).to_elements() == [x * Fp(7) for x in left]
+    assert (-v1)[3] == -left[3]
+    assert (v1 + v2).dot(v2) == Poly.dot([x + y for (x, y) in zip(left, right)], right)
+    assert v1[10:20] == FpVec.from_elements(left[10:20])
+
+    poly = Poly([Fq(x) for x in [1, 2, 3, 0]])
+    assert FqVec.from_poly(poly).to_poly() == poly
+    assert (FqVec.from_poly(poly) - FqVec.from_poly(poly)).to_poly() == Poly([])
+
+    print("Success.")
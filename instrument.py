@@ -0,0 +1,194 @@
+# This code implements opt-in operation counters for field, curve and polynomial arithmetic
+#   While enabled, the hot methods are replaced by wrappers that count calls and accumulate wall time per category;
+#   disabling restores the original methods, so there is no cost at all when instrumentation is off.
+#   Use `with instrumented() as stats: ...`, or set ZERO11_INSTRUMENT=flat (or json) before importing this module to
+#   count the whole run and print the report to stderr at exit.
+#   field.mul counts every field multiplication: calls of the Fp/Fq operator (timed) plus the multiplications the
+#   int-level kernels perform internally (point addition and doubling, the NTT, convolve, sum_of_products), which
+#   are added from each kernel's operation count and not timed separately; their time is under the kernel's own
+#   category. Times are inclusive, e.g. point.mul includes its point.add and point.double time
+
+import atexit
+import json
+import os
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+import ntt
+import poly
+from curves import Pallas
+from fields import Fp
+from poly import Poly
+
+counters = defaultdict(lambda: [0, 0.0])  # category -> [calls, seconds]
+originals = dict()  # (class, method name) -> original attribute, while enabled
+depth = 0  # Nesting level of enable() calls
+
+
+# Sizes are bucketed by the larger operand's length rounded up to a power of two
+def poly_bucket(operation):
+    return lambda self, other, *_args: f'{operation}.2^{(max(len(self.coeffs), len(other.coeffs)) - 1).bit_length()}'
+
+
+def transform_bucket(values, _field, inverse=False):
+    return f'ntt.transform.2^{(len(values) - 1).bit_length()}'
+
+
+# The field operator hands scalar * point over to the point; only products with a field element or int count
+def field_mul_category(self, other):
+    return 'field.mul' if type(other) is type(self) or type(other) is int else None
+
+
+# Field multiplications inside the int-level kernels: 12M + 2 m_3b for Algorithm 7, 6M + 2S + 1 m_3b for
+#   Algorithm 9 and 17 for Algorithm 1 (which __add__ only runs for explicit a, b); one per butterfly, plus the
+#   1/n scaling of an inverse transform; mul_ntt adds its pointwise products
+def transform_muls(values, _field, inverse=False):
+    return len(values) // 2 * (len(values).bit_length() - 1) + (len(values) if inverse else 0)
+
+
+# (object, attribute name, category or function of the call's arguments giving the category (None: this call gets no
+#   entry), or None for no entry of its own, and None or a function of the arguments giving the field multiplications
+#   the call performs on ints)
+TARGETS = [(Fp.__bases__[0], '__mul__', field_mul_category, None),
+           (Fp.__bases__[0], 'inv0', 'field.inv', None),
+           (Fp.__bases__[0], 'batch_inv', 'field.batch_inv', None),
+           (Fp.__bases__[0], '__pow__', 'field.pow', None),
+           (Fp.__bases__[0], 'sqrt_or_none', 'field.sqrt', None),
+           (Fp.__bases__[0], 'sqrt_ratio', 'field.sqrt_ratio', None),
+           (Fp.__bases__[0], 'convolve', 'field.convolve',
+            lambda _cls, left, right: sum(1 for x in left if x.value != 0) * len(right)),
+           (Fp.__bases__[0], 'sum_of_products', 'field.sum_of_products',
+            lambda _cls, left, right: min(len(left), len(right))),
+           (Pallas.__bases__[0], '__add__', 'point.add',
+            lambda _self, _other, a=None, b=None: 0 if a is None and b is None else 17),
+           (Pallas.__bases__[0], 'add_a0', None, lambda _self, _other: 14),
+           (Pallas.__bases__[0], 'double', 'point.double', lambda _self: 9),
+           (Pallas.__bases__[0], '__mul__', 'point.mul', None),
+           (ntt, 'transform', transform_bucket, transform_muls),
+           (poly, 'transform', transform_bucket, transform_muls),  # poly imported the name itself
+           (Poly, '__mul__', poly_bucket('poly.mul'), None),
+           (Poly, 'mul_ntt', None, lambda self, other: 2 ** (len(self.coeffs) + len(other.coeffs) - 2).bit_length()),
+           (Poly, '__truediv__', poly_bucket('poly.div'), None)]
+
+
+def counted(func, category, muls):
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            key = category if category is None or type(category) is str else category(*args, **kwargs)
+            if key is not None:
+                entry = counters[key]
+                entry[0] += 1
+                entry[1] += perf_counter() - start
+            if muls is not None: counters['field.mul'][0] += muls(*args, **kwargs)
+    return wrapper
+
+
+def enable():
+    global depth
+    depth += 1
+    if depth > 1: return
+    for (target, name, category, muls) in TARGETS:
+        original = target.__dict__[name]
+        originals[(target, name)] = original
+        if isinstance(original, classmethod):
+            setattr(target, name, classmethod(counted(original.__func__, category, muls)))
+        else:
+            setattr(target, name, counted(original, category, muls))
+
+
+def disable():
+    global depth
+    assert depth > 0
+    depth -= 1
+    if depth > 0: return
+    for ((target, name), original) in originals.items(): setattr(target, name, original)
+    originals.clear()
+
+
+def reset():
+    counters.clear()
+
+
+# {category: {"calls": n, "seconds": t}}, sorted by category
+def report():
+    return {category: {'calls': calls, 'seconds': seconds} for (category, (calls, seconds)) in sorted(counters.items())}
+
+
+def report_json():
+    return json.dumps(report(), indent=2)
+
+
+def report_flat():
+    return '\n'.join(f'{category:24} {entry["calls"]:12} calls {entry["seconds"]:12.6f} s'
+                     for (category, entry) in report().items())
+
+
+# Counts from zero within the outermost block; the counters stay readable afterwards via the yielded report function
+@contextmanager
+def instrumented():
+    if depth == 0: reset()
+    enable()
+    try:
+        yield report
+    finally:
+        disable()
+
+
+if os.environ.get('ZERO11_INSTRUMENT', '') in ('flat', 'json', '1'):
+    enable()
+    atexit.register(lambda: print(report_json() if os.environ['ZERO11_INSTRUMENT'] == 'json' else report_flat(),
+                                  file=sys.stderr))
+
+
+if __name__ == '__main__':
+    print("Starting instrument.py quick self-test")
+    from fields import Fq
+
+    original_mul = Fp.__bases__[0].__dict__['__mul__']
+    base = Pallas.base()  # Builds the fixed-base table outside the counted block
+    with instrumented() as stats:
+        x = Fp(3) * Fp(5) * Fp(7)
+        Fq(4).sqrt()
+        Fp.batch_inv([Fp(2), Fp(3)])
+        base.double() + base
+        Poly([Fp(1)] * 5) * Poly([Fp(2)] * 3)
+        with instrumented():  # Nested blocks share the counters and leave the wrappers in place
+            x.inv0()
+        x.inv0()
+    result = stats()
+    assert result['field.mul']['calls'] >= 2 and result['field.inv']['calls'] == 2
+    assert result['field.sqrt']['calls'] == 1 and result['field.batch_inv']['calls'] == 1
+    assert result['point.add']['calls'] == 1 and result['point.double']['calls'] == 1
+    assert result['poly.mul.2^3']['calls'] == 1 and 'poly.div.2^3' not in result
+    assert Fp.__bases__[0].__dict__['__mul__'] is original_mul and Fp.__mul__ is original_mul
+    Fp(3) * Fp(5)
+    assert stats() == result
+
+    with instrumented() as stats:  # Int-level kernels still show up as field multiplications
+        base.double()
+    assert stats()['field.mul']['calls'] == 9 and stats()['point.double']['calls'] == 1
+    with instrumented() as stats:
+        (base + base) * Fq(2 ** 200 + 12345)  # Variable base: GLV + wNAF
+    counts = {category: entry['calls'] for (category, entry) in stats().items()}
+    assert counts['field.mul'] >= 14 * counts['point.add'] + 9 * counts['point.double'] > 500
+    with instrumented() as stats:
+        Fq(3) * (base + base)  # Handed to the point: one point.mul and no field.mul of its own
+    counts = {category: entry['calls'] for (category, entry) in stats().items()}
+    assert counts['point.mul'] == 1 and counts['field.mul'] == 14 * counts['point.add'] + 9 * counts['point.double']
+    with instrumented() as stats:
+        Fp(3) * Fp(5) * 7
+    assert stats()['field.mul']['calls'] == 2
+    with instrumented() as stats:
+        Poly([Fp(1)] * 200) * Poly([Fp(2)] * 200)
+        Fp.convolve([Fp(1), Fp(0), Fp(2)], [Fp(3)] * 4)
+    assert stats()['ntt.transform.2^9']['calls'] == 3 and stats()['field.convolve']['calls'] == 1
+    assert stats()['field.mul']['calls'] == 3 * 256 * 9 + 512 + 512 + 8
+    assert ntt.transform is poly.transform
+    assert 'field.mul' in report_flat() and json.loads(report_json()) == stats()
+
+    print("Success.")
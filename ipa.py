@@ -0,0 +1,188 @@
+# This code implements the Halo inner-product argument (IPA) polynomial opening over Pallas with Fq scalars
+#   See https://eprint.iacr.org/2019/1021.pdf section 3.1 (the protocol main.py used to hand-roll)
+
+from collections import namedtuple
+
+from curves import Pallas
+from fields import Fq
+from fieldvec import FqVec
+from msm import msm
+from transcript import Transcript
+
+# Non-interactive via Fiat-Shamir: the verifier's challenges (the point U, one u per round and c) are squeezed from
+#   a transcript of the statement and the prover's messages, so the verifier re-derives them instead of reading them
+Proof = namedtuple("Proof", "L R big_r z1 z2")
+TRANSCRIPT_LABEL = b'zero11-ipa'
+
+
+# Proves that the polynomial with the given coefficients, committed as <coeffs, crs.g> + r * crs.h, evaluates to
+#   v = poly(x); len(coeffs) must equal len(crs.g) and be a power of two. A transcript that already holds outer
+#   protocol messages may be passed in; the verifier must then be given a transcript in the same state
+def prove(crs, commitment, coeffs, r, x, transcript=None):
+    n = len(coeffs)
+    assert n == len(crs.g) and n & (n - 1) == 0
+    g_prime, g_scale = list(crs.g), Fq(1)  # The folded generators are g_scale * g_prime, see the fold below
+    a_prime = FqVec.from_elements(coeffs)
+    b_prime = FqVec(powers(x, n))
+    transcript = statement(transcript, commitment, x, a_prime.dot(b_prime))
+    u_point = transcript.challenge_point(b'U', Pallas)
+    r_prime = r
+    big_l, big_r = [], []
+    while len(g_prime) > 1:
+        half = len(g_prime) // 2
+        a_lo, a_hi, b_lo, b_hi = a_prime[0:half], a_prime[half:], b_prime[0:half], b_prime[half:]
+        l_blind, r_blind = Fq.rnd(), Fq.rnd()
+        l_scalars = (a_lo * g_scale).to_elements() + [l_blind, a_lo.dot(b_hi)]
+        r_scalars = (a_hi * g_scale).to_elements() + [r_blind, a_hi.dot(b_lo)]
+        big_l.append(msm(g_prime[half:] + [crs.h, u_point], l_scalars))
+        big_r.append(msm(g_prime[0:half] + [crs.h, u_point], r_scalars))
+        transcript.append_points(b'LR', [big_l[-1], big_r[-1]])
+        u = transcript.challenge_scalar(b'u', Fq)
+        u_inv, u_sq = u.inv0(), u * u
+        a_prime = (a_hi * u_inv + a_lo * u).reduce()
+        b_prime = (b_lo * u_inv + b_hi * u).reduce()
+        # g_lo * u_inv + g_hi * u = u_inv * (g_lo + g_hi * u^2): one (GLV) multiplication per pair, with the common
+        #   u_inv folded into g_scale and applied only through the scalars above and to the last generator
+        g_prime = [g_lo + g_hi * u_sq for (g_lo, g_hi) in zip(g_prime[0:half], g_prime[half:])]
+        g_scale = g_scale * u_inv
+        r_prime = r_prime + l_blind * u_sq + r_blind * u_inv * u_inv
+    # Zero-knowledge opening of Q = a0 * (G0 + b0 * U) + r' * H, i.e. a Schnorr proof of knowledge of (a0, r')
+    g0_b0u = g_prime[0] * g_scale + u_point * b_prime[0]
+    d, s = Fq.rnd(), Fq.rnd()
+    commit_r = g0_b0u * d + crs.h * s  # GLV multiplications; two-point msm() would not split the scalars
+    transcript.append_point(b'R', commit_r)
+    c = transcript.challenge_scalar(b'c', Fq)
+    z1 = a_prime[0] * c + d
+    z2 = c * r_prime + s
+    return Proof(L=big_l, R=big_r, big_r=commit_r, z1=z1, z2=z2)
+
+
+# Absorbs the claim "commitment opens to v at x" into the given transcript, or into a fresh one
+def statement(transcript, commitment, x, v):
+    transcript = Transcript(TRANSCRIPT_LABEL) if transcript is None else transcript
+    transcript.append_point(b'commitment', commitment)
+    transcript.append_scalar(b'x', x)
+    transcript.append_scalar(b'v', v)
+    return transcript
+
+
+# [1, x, x**2, ..., x**(n-1)] as ints
+def powers(x, n):
+    result = [1] * n
+    for index in range(1, n): result[index] = result[index - 1] * x.value % Fq.modulus
+    return result
+
+
+# s[i] is the product over rounds of u_j when bit j of i is set and of 1/u_j otherwise (bit 0 is the last round),
+#   so that <s, G> is the fully folded generator; built in O(n) by doubling s with one multiply per entry
+def s_vector(challenges, challenges_inv):
+    rounds = list(zip(reversed(challenges), reversed(challenges_inv)))
+    s = [1]
+    for (_u, u_inv) in rounds: s[0] = s[0] * u_inv.value % Fq.modulus
+    for (u, _u_inv) in rounds:
+        u_sq = u.value * u.value % Fq.modulus
+        s = s + [x * u_sq % Fq.modulus for x in s]
+    return [Fq.from_reduced(x) for x in s]
+
+
+# b0 = <s, [1, x, x**2, ...]> factors as the product over rounds of (1/u_j + u_j * x**(2**j))
+def b0_value(challenges, challenges_inv, x):
+    result, x_power = Fq(1), x
+    for (u, u_inv) in zip(reversed(challenges), reversed(challenges_inv)):
+        result = result * (u_inv + u * x_power)
+        x_power = x_power * x_power
+    return result
+
+
+# The verification equation as (points, scalars) whose MSM is the neutral point exactly when the proof is valid:
+#   c * (sum u_j^2 L_j + P + v U + sum u_j^-2 R_j) + R - z1 * (<s, G> + b0 U) - z2 H
+#   The scalars of the CRS generators H and G are returned separately so batches can merge them
+def verification_terms(crs, commitment, x, v, proof, transcript=None):
+    assert len(proof.L) == len(proof.R) and 2 ** len(proof.L) == len(crs.g)
+    transcript = statement(transcript, commitment, x, v)
+    u_point = transcript.challenge_point(b'U', Pallas)
+    challenges = []
+    for (big_l, big_r) in zip(proof.L, proof.R):
+        transcript.append_points(b'LR', [big_l, big_r])
+        challenges.append(transcript.challenge_scalar(b'u', Fq))
+    transcript.append_point(b'R', proof.big_r)
+    c = transcript.challenge_scalar(b'c', Fq)
+    challenges_inv = Fq.batch_inv(challenges)
+    s = s_vector(challenges, challenges_inv)
+    b0 = b0_value(challenges, challenges_inv, x)
+    points = proof.L + proof.R + [commitment, u_point, proof.big_r]
+    scalars = [c * u * u for u in challenges] + [c * u_inv * u_inv for u_inv in challenges_inv] + \
+        [c, c * v - proof.z1 * b0, Fq(1)]
+    return points, scalars, -proof.z2, [-proof.z1 * s_i for s_i in s]
+
+
+def verify(crs, commitment, x, v, proof, transcript=None):
+    points, scalars, h_scalar, g_scalars = verification_terms(crs, commitment, x, v, proof, transcript)
+    return msm(points + [crs.h] + list(crs.g), scalars + [h_scalar] + g_scalars) == Pallas.neutral()
+
+
+# Checks many openings against the same CRS with one MSM: each verification equation is scaled by a fresh random
+#   weight and the weighted equations are summed, so the CRS generators appear once with merged scalars.
+#   A batch passes only if every opening is valid, except with probability about len(openings) / Fq.modulus
+#   Each opening is (commitment, x, v, proof) or (commitment, x, v, proof, transcript) for a proof bound to an outer
+#   transcript, which must be in the state the prover's was in (as for verify())
+def batch_verify(crs, openings):
+    points, scalars = [], []
+    h_scalar, g_scalars = 0, [0] * len(crs.g)
+    for opening in openings:
+        weight = Fq.rnd()
+        terms = verification_terms(crs, *opening)
+        points.extend(terms[0])
+        scalars.extend([weight * scalar for scalar in terms[1]])
+        h_scalar = h_scalar + weight.value * terms[2].value
+        g_scalars = [acc + weight.value * g_scalar.value for (acc, g_scalar) in zip(g_scalars, terms[3])]
+    points = points + [crs.h] + list(crs.g)
+    scalars = scalars + [Fq(h_scalar)] + [Fq(acc) for acc in g_scalars]
+    return msm(points, scalars) == Pallas.neutral()
+
+
+if __name__ == '__main__':
+    print("Starting ipa.py quick self-test")
+    from main import commit, setup
+    from poly import Poly
+
+    for size in [1, 2, 8, 16]:
+        crs1 = setup(size)
+        poly1 = Poly([Fq.rnd() for _i in range(size)])
+        x1, r1 = Fq.rnd(), Fq.rnd()
+        v1 = poly1.eval(x1)
+        poly_commit = commit(crs1, poly1.coeffs, r1)
+        proof1 = prove(crs1, poly_commit, poly1.coeffs, r1, x1)
+        assert verify(crs1, poly_commit, x1, v1, proof1)
+        assert not verify(crs1, poly_commit, x1, v1 + Fq(1), proof1)
+        assert not verify(crs1, poly_commit + crs1.h, x1, v1, proof1)
+        assert not verify(crs1, poly_commit, x1 + Fq(1), v1, proof1)
+        assert not verify(crs1, poly_commit, x1, v1, proof1._replace(z1=proof1.z1 + Fq(1)))
+
+    outer = Transcript(b'zero11-outer')  # Bound to outer protocol messages, so a fresh transcript must not verify
+    outer.append_scalar(b'round', Fq(1))
+    proof1 = prove(crs1, poly_commit, poly1.coeffs, r1, x1, outer.copy())
+    assert verify(crs1, poly_commit, x1, v1, proof1, outer.copy())
+    assert not verify(crs1, poly_commit, x1, v1, proof1)
+
+    crs1 = setup(8)
+    openings = []
+    for _i in range(5):
+        poly1 = Poly([Fq.rnd() for _j in range(8)])
+        x1, r1 = Fq.rnd(), Fq.rnd()
+        commitment1 = commit(crs1, poly1.coeffs, r1)
+        openings.append((commitment1, x1, poly1.eval(x1), prove(crs1, commitment1, poly1.coeffs, r1, x1)))
+    assert batch_verify(crs1, openings)
+    (commitment1, x1, v1, proof1) = openings[2]
+    openings[2] = (commitment1, x1, v1 + Fq(1), proof1)
+    assert not batch_verify(crs1, openings)
+
+    openings[2] = (commitment1, x1, v1, proof1)  # Mixes in an opening bound to an outer transcript
+    outer = Transcript(b'zero11-outer')
+    outer.append_scalar(b'round', Fq(2))
+    commitment2, x2 = commit(crs1, poly1.coeffs, r1), Fq.rnd()
+    proof2 = prove(crs1, commitment2, poly1.coeffs, r1, x2, outer.copy())
+    assert batch_verify(crs1, openings + [(commitment2, x2, poly1.eval(x2), proof2, outer.copy())])
+    assert not batch_verify(crs1, openings + [(commitment2, x2, poly1.eval(x2), proof2)])
+
+    print("Success.")
@@ -0,0 +1,124 @@
+# This code implements multi-scalar multiplication (Pippenger's bucket method, Straus for few points) for Pallas and Vesta
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import log
+
+from curves import Pallas, Vesta
+from fields import Fp, Fq
+
+STRAUS_THRESHOLD = 48  # Below this many points straus() beats Pippenger (measured crossover)
+PARALLEL_THRESHOLD = 256  # Below this many points process start-up and transfer outweigh the gain
+
+
+# Window size in bits, roughly ln(n) + 2; see https://eprint.iacr.org/2012/549.pdf section 4
+def window_size(n):
+    if n < 32: return 3
+    return int(log(n)) + 2
+
+
+# Returns sum(points[i] * scalars[i]) for Pallas points with Fq scalars, or Vesta points with Fp scalars;
+#   workers > 1 (optionally with an executor to reuse) spreads the work over processes, see msm_parallel()
+def msm(points, scalars, workers=1, executor=None):
+    assert len(points) == len(scalars) and len(points) > 0
+    assert (type(points[0]) is Pallas and type(scalars[0]) is Fq) or \
+           (type(points[0]) is Vesta and type(scalars[0]) is Fp)
+    if (workers > 1 or executor is not None) and len(points) >= PARALLEL_THRESHOLD:
+        return msm_parallel(points, scalars, workers, executor)
+    if len(points) < STRAUS_THRESHOLD: return straus(points, scalars)
+    c = window_size(len(points))
+    mask = 2 ** c - 1
+    values = [scalar.value for scalar in scalars]
+    num_windows = (max(values).bit_length() + c - 1) // c
+    result = None  # None stands in for the neutral point, which saves needless additions
+    for window in range(num_windows - 1, -1, -1):
+        if result is not None:
+            for _i in range(c): result = result.double()
+        buckets = [None] * mask  # buckets[k] accumulates the points whose window digit is k + 1
+        shift = window * c
+        for (point, value) in zip(points, values):
+            digit = (value >> shift) & mask
+            if digit == 0: continue
+            buckets[digit - 1] = point if buckets[digit - 1] is None else buckets[digit - 1] + point
+        running = window_sum = None  # sum(k * buckets[k-1]) via running sums from the top bucket down
+        for bucket in reversed(buckets):
+            if bucket is not None: running = bucket if running is None else running + bucket
+            if running is not None: window_sum = running if window_sum is None else window_sum + running
+        if window_sum is not None: result = window_sum if result is None else result + window_sum
+    return points[0].neutral() if result is None else result
+
+
+# Interleaved windowed multiplication (Straus/Shamir): the doublings are shared, each point keeps its own small
+#   table of multiples; cheaper than Pippenger's buckets for a handful of points
+def straus(points, scalars, window=4):
+    assert len(points) == len(scalars) and len(points) > 0
+    mask = 2 ** window - 1
+    tables = []
+    for point in points:
+        row = [point]
+        for _i in range(mask - 1): row.append(row[-1] + point)
+        tables.append(row)
+    values = [scalar.value for scalar in scalars]
+    result = None
+    for shift in range(((max(values).bit_length() + window - 1) // window - 1) * window, -1, -window):
+        if result is not None:
+            for _i in range(window): result = result.double()
+        for (table, value) in zip(tables, values):
+            digit = (value >> shift) & mask
+            if digit != 0: result = table[digit - 1] if result is None else result + table[digit - 1]
+    return points[0].neutral() if result is None else result
+
+
+# Splits the bases into one contiguous chunk per worker, runs a serial MSM on each chunk in its own process and
+#   adds the partial sums here. Points travel as affine (x, y) int pairs (one shared inversion via batch_normalize)
+#   and scalars as ints, rather than as pickled field objects; neutral points and zero scalars are dropped up front
+def msm_parallel(points, scalars, workers=None, executor=None):
+    curve = type(points[0])
+    pairs = [(pt, s.value) for (pt, s) in zip(points, scalars) if s.value != 0 and pt.xyz[2] != 0]
+    if len(pairs) == 0: return curve.neutral()
+    affine = curve.batch_normalize([pt for (pt, _s) in pairs])
+    coords = [pt.xyz[0:2] for pt in affine]
+    values = [value for (_pt, value) in pairs]
+    if workers is None or workers <= 1: workers = os.cpu_count() or 1  # Also the chunk count for a given executor
+    size = -(-len(coords) // workers)
+    chunks = [(curve.__name__, coords[i:i + size], values[i:i + size]) for i in range(0, len(coords), size)]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(msm_chunk, *zip(*chunks)))
+    else:
+        partials = list(executor.map(msm_chunk, *zip(*chunks)))
+    result = curve.neutral()
+    for (x, y, z) in partials: result = result + curve.from_ints(x, y, z)
+    return result
+
+
+# Worker side of msm_parallel
+def msm_chunk(curve_name, coords, values):
+    curve = {'Pallas': Pallas, 'Vesta': Vesta}[curve_name]
+    scalar_field = Fq if curve is Pallas else Fp
+    result = msm([curve.from_ints(x, y, 1) for (x, y) in coords], [scalar_field.from_reduced(v) for v in values])
+    return result.xyz
+
+
+if __name__ == "__main__":
+    print("Starting msm.py quick self-test")
+    from functools import reduce
+    from random import randint
+
+    for size in [1, 2, 7, 40, 60]:
+        pts = [Pallas.base() * Fq(randint(1, Pallas.order - 1)) for _i in range(size)]
+        scl = [Fq(randint(0, Pallas.order - 1)) for _i in range(size)]
+        expected = reduce(lambda x, y: x + y, [p * s for (p, s) in zip(pts, scl)])
+        assert msm(pts, scl) == expected
+        assert straus(pts, scl) == expected
+
+    pts = [Pallas.base() * Fq(randint(1, Pallas.order - 1)) for _i in range(300)] + [Pallas.neutral()]
+    scl = [Fq(randint(0, Pallas.order - 1)) for _i in range(300)] + [Fq(5)]
+    scl[7] = Fq(0)
+    assert msm(pts, scl, workers=3) == msm(pts, scl)
+
+    vts = [Vesta.base() * Fp(x) for x in [3, 5, 7]]
+    assert msm(vts, [Fp(2), Fp(0), Fp(1)]) == Vesta.base() * Fp(13)
+    assert msm(vts, [Fp(0), Fp(0), Fp(0)]) == Vesta.neutral()
+
+    print("Success.")
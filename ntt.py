@@ -0,0 +1,139 @@
+# This code implements the radix-2 number-theoretic transform (NTT) over the Fp and Fq fields
+
+from functools import lru_cache
+
+
+# Both fields have modulus = 2**s * q + 1 with s = 32, and c = n**q (n a non-square) has order exactly 2**s,
+#   so squaring c repeatedly yields a primitive root of unity for every power-of-two size up to 2**32
+def root_of_unity(field, log_size):
+    assert 0 <= log_size <= field.s
+    return field(pow(field.c, 2 ** (field.s - log_size), field.modulus))
+
+
+# The multiplicative subgroup <omega> of size 2**k >= size, or its coset shift * <omega> when shift is given
+class Domain:
+    def __init__(self, field, size, shift=None):
+        assert size > 0
+        self.field = field
+        self.log_size = (size - 1).bit_length()
+        self.size = 2 ** self.log_size
+        self.omega = root_of_unity(field, self.log_size)
+        self.shift = field(1) if shift is None else shift
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} field={self.field.__name__} size={self.size} shift={self.shift}'
+
+    def elements(self):
+        result = [self.shift]
+        for _i in range(1, self.size): result.append(result[-1] * self.omega)
+        return result
+
+    # The vanishing polynomial is X**size - shift**size; this is its constant term negated
+    def vanishing_constant(self):
+        return self.shift ** self.size
+
+
+# Powers omega**0 .. omega**(size/2 - 1) (or of omega**-1) as ints, shared by every transform of that size
+@lru_cache(maxsize=None)
+def twiddles(field, log_size, inverse):
+    omega = root_of_unity(field, log_size).value
+    if inverse: omega = pow(omega, field.modulus - 2, field.modulus)
+    result = [1] * max(1, 2 ** log_size // 2)
+    for index in range(1, len(result)):
+        result[index] = result[index - 1] * omega % field.modulus
+    return tuple(result)
+
+
+# In-place iterative Cooley-Tukey on a list of ints (natural order in and out); inverse includes the 1/size scaling
+#   See https://en.wikipedia.org/wiki/Cooley%E2%80%93Tukey_FFT_algorithm#Data_reordering,_bit_reversal,_and_in-place_algorithms
+def transform(values, field, inverse=False):
+    size, modulus = len(values), field.modulus
+    log_size = size.bit_length() - 1
+    assert size == 2 ** log_size
+    j = 0
+    for i in range(1, size):  # Bit-reversal permutation
+        bit = size >> 1
+        while j & bit:
+            j ^= bit
+            bit >>= 1
+        j |= bit
+        if i < j: values[i], values[j] = values[j], values[i]
+    table = twiddles(field, log_size, inverse)
+    half = 1
+    while half < size:
+        step = size // (2 * half)
+        roots = table[::step][:half]
+        for start in range(0, size, 2 * half):
+            for k in range(half):
+                u = values[start + k]
+                v = values[start + k + half] * roots[k] % modulus
+                values[start + k] = (u + v) % modulus
+                values[start + k + half] = (u - v) % modulus
+        half *= 2
+    if inverse:
+        size_inv = pow(size, modulus - 2, modulus)
+        for index in range(size): values[index] = values[index] * size_inv % modulus
+    return values
+
+
+# Scales values[i] by shift**i (in place), moving between the subgroup and the coset shift * <omega>
+def scale_by_powers(values, field, shift):
+    power = 1
+    for index in range(len(values)):
+        values[index] = values[index] * power % field.modulus
+        power = power * shift % field.modulus
+    return values
+
+
+# Evaluations of the polynomial with the given coefficients at omega**i; len(coeffs) must be a power of two
+def ntt(coeffs):
+    field = type(coeffs[0])
+    return [field.from_reduced(v) for v in transform([c.value for c in coeffs], field)]
+
+
+# Coefficients of the polynomial taking the given values at omega**i
+def intt(evals):
+    field = type(evals[0])
+    return [field.from_reduced(v) for v in transform([e.value for e in evals], field, inverse=True)]
+
+
+# Evaluations at shift * omega**i; the default shift is the field's non-square n, which lies outside every subgroup
+def coset_ntt(coeffs, shift=None):
+    field = type(coeffs[0])
+    shift = field.n if shift is None else shift.value
+    return [field.from_reduced(v) for v in transform(scale_by_powers([c.value for c in coeffs], field, shift), field)]
+
+
+def coset_intt(evals, shift=None):
+    field = type(evals[0])
+    shift = field.n if shift is None else shift.value
+    shift_inv = pow(shift, field.modulus - 2, field.modulus)
+    return [field.from_reduced(v) for v in scale_by_powers(transform([e.value for e in evals], field, inverse=True),
+                                              field, shift_inv)]
+
+
+if __name__ == "__main__":
+    print("Starting ntt.py quick self-test")
+    from random import randint
+    from fields import Fp, Fq
+
+    for field in [Fp, Fq]:
+        assert root_of_unity(field, field.s) ** (2 ** (field.s - 1)) == field(-1)
+        assert root_of_unity(field, 3) ** 8 == field(1) and root_of_unity(field, 3) ** 4 == field(-1)
+
+        coeffs = [field(randint(0, field.modulus - 1)) for _i in range(16)]
+        omega = root_of_unity(field, 4)
+        evals = ntt(coeffs)
+        for i in range(16):
+            expected = field(0)
+            for (j, coeff) in enumerate(coeffs): expected = expected + coeff * omega ** (i * j)
+            assert evals[i] == expected
+        assert intt(evals) == coeffs
+
+        shifted = coset_ntt(coeffs)
+        assert shifted[1] == sum([coeff * (field(field.n) * omega) ** j for (j, coeff) in enumerate(coeffs)],
+                                 field(0))
+        assert coset_intt(shifted) == coeffs
+        assert coset_intt(coset_ntt(coeffs, field(7)), field(7)) == coeffs
+
+    print("Success.")
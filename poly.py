@@ -1,9 +1,15 @@
-from functools import reduce
 
+from curves import Pallas, Vesta
 from fields import Fp, Fq
+from msm import msm
+from ntt import Domain, scale_by_powers, transform
 
 
 class Poly:
+    ntt_threshold = 128  # Multiply via NTT once both operands have at least this many coefficients
+    newton_threshold = 128  # Divide via Newton inversion once divisor and quotient have at least this many coefficients
+    multipoint_threshold = 256  # Evaluate through a subproduct tree from this many points on, down to blocks of 8
+
     def __init__(self, coeffs):
         assert isinstance(coeffs, list) and (len(coeffs) == 0 or (isinstance(coeffs[0], Fp) or isinstance(coeffs[0], Fq)))
         self.coeffs = self.trim_leading_0s(coeffs)  # list of Fp or Fq or empty
@@ -50,22 +56,83 @@ class Poly:
     def __mul__(self, other):
         assert type(self) == type(other)
         if len(self.coeffs) == 0 or len(other.coeffs) == 0: return Poly([])
-        result = [type(self.coeffs[0])(0)] * (len(self.coeffs) * len(other.coeffs))
-        for i in range(len(self.coeffs)):
-            for j in range(len(other.coeffs)):
-                result[i+j] = result[i+j] + self.coeffs[i] * other.coeffs[j]
-        return Poly(self.trim_leading_0s(result))
+        if min(len(self.coeffs), len(other.coeffs)) >= self.ntt_threshold: return self.mul_ntt(other)
+        return Poly(self.trim_leading_0s(type(self.coeffs[0]).convolve(self.coeffs, other.coeffs)))
+
+    # Pad to a power of two at least len(a) + len(b) - 1, transform, multiply pointwise and transform back
+    def mul_ntt(self, other):
+        field = type(self.coeffs[0])
+        assert type(other.coeffs[0]) is field
+        length = len(self.coeffs) + len(other.coeffs) - 1
+        size = 2 ** (length - 1).bit_length()
+        left = transform([x.value for x in self.coeffs] + [0] * (size - len(self.coeffs)), field)
+        right = transform([x.value for x in other.coeffs] + [0] * (size - len(other.coeffs)), field)
+        product = transform([x * y for (x, y) in zip(left, right)], field, inverse=True)
+        return Poly(self.trim_leading_0s([field.from_reduced(x) for x in product[0:length]]))
 
     def __truediv__(self, other):
         assert type(self) == type(other) and len(other.coeffs) != 0
-        q = Poly([])
-        r = self
-        while len(r.coeffs) != 0 and len(r.coeffs) >= len(other.coeffs):
-            t = r.coeffs[-1] / other.coeffs[-1]  # Leading scale factor
-            trailing = [type(self.coeffs[0])(0)] * (len(r.coeffs) - len(other.coeffs))
-            q = q + Poly(trailing + [t])
-            r = r - Poly(trailing + [t]) * other
-        return q, r  # at some point, require r = []
+        if min(len(other.coeffs), len(self.coeffs) - len(other.coeffs) + 1) >= self.newton_threshold:
+            return self.divmod_newton(other)
+        field = type(other.coeffs[0])
+        if len(self.coeffs) < len(other.coeffs): return Poly([]), self
+        r = list(self.coeffs)
+        q = [field(0)] * (len(self.coeffs) - len(other.coeffs) + 1)
+        lead_inv = other.coeffs[-1].inv0()
+        for index in range(len(q) - 1, -1, -1):  # Schoolbook long division, updating the remainder in place
+            t = r[index + len(other.coeffs) - 1] * lead_inv  # Leading scale factor
+            q[index] = t
+            for (j, coeff) in enumerate(other.coeffs):
+                r[index + j] = r[index + j] - t * coeff
+        return Poly(self.trim_leading_0s(q)), Poly(self.trim_leading_0s(r[0:len(other.coeffs) - 1]))
+
+    # Returns g with self * g = 1 mod X^n via Newton iteration g <- g * (2 - self * g); needs a non-zero constant
+    #   See https://www.csd.uwo.ca/~mmorenom/CS424/Lectures/FastDivisionAndGcd.html/node3.html
+    def inverse_mod_xn(self, n):
+        assert len(self.coeffs) > 0 and self.coeffs[0].value != 0
+        field = type(self.coeffs[0])
+        g, k = Poly([self.coeffs[0].inv0()]), 1
+        while k < n:
+            k = min(2 * k, n)
+            fg = (Poly(self.coeffs[0:k]) * g).coeffs[0:k]
+            e = [-x for x in fg] + [field(0)] * (k - len(fg))
+            e[0] = e[0] + field(2)
+            g = Poly((g * Poly(e)).coeffs[0:k])
+        return g
+
+    # Fast division: the reversed quotient is rev(self) * rev(other)^-1 mod X^(deg(self) - deg(other) + 1)
+    def divmod_newton(self, other):
+        assert type(self) == type(other) and len(other.coeffs) != 0
+        if len(self.coeffs) < len(other.coeffs): return Poly([]), self
+        field = type(other.coeffs[0])
+        k = len(self.coeffs) - len(other.coeffs) + 1
+        rev_inv = Poly(other.coeffs[::-1]).inverse_mod_xn(k)
+        q_rev = (Poly(self.coeffs[::-1][0:k]) * rev_inv).coeffs[0:k]
+        q = Poly((q_rev + [field(0)] * (k - len(q_rev)))[::-1])
+        return q, self - other * q
+
+    # Linear-time division by the domain's vanishing polynomial X^n - c (c = 1 on the subgroup, shift^n on a coset)
+    def divide_by_vanishing(self, domain):
+        if len(self.coeffs) == 0: return Poly([]), Poly([])
+        assert type(self.coeffs[0]) is domain.field
+        n, c = domain.size, domain.vanishing_constant()
+        if len(self.coeffs) <= n: return Poly([]), self
+        q = list(self.coeffs[n:])
+        for index in range(len(q) - n - 1, -1, -1):  # a_i+n = q_i - c * q_i+n, read from the top down
+            q[index] = q[index] + c * q[index + n]
+        r = [self.coeffs[index] + c * q[index] if index < len(q) else self.coeffs[index] for index in range(n)]
+        return Poly(self.trim_leading_0s(q)), Poly(self.trim_leading_0s(r))
+
+    # Evaluation form over the domain; coefficients beyond its size are first folded modulo its vanishing polynomial
+    def evaluate_over(self, domain):
+        values = [0] * domain.size
+        c, power = domain.vanishing_constant().value, 1
+        for start in range(0, len(self.coeffs), domain.size):
+            for (index, coeff) in enumerate(self.coeffs[start:start + domain.size]):
+                values[index] = (values[index] + coeff.value * power) % domain.field.modulus
+            power = power * c % domain.field.modulus
+        if domain.shift.value != 1: scale_by_powers(values, domain.field, domain.shift.value)
+        return Evals(domain, [domain.field.from_reduced(v) for v in transform(values, domain.field)])
 
     # Note, this can/will evolve to handle scalar * point
     # https://en.wikipedia.org/wiki/Horner%27s_method
@@ -77,12 +144,63 @@ class Poly:
             result = result + self.coeffs[index-1]
         return result
 
+    # Values at many points: the polynomial is reduced modulo the subproduct tree's nodes from the root down, so
+    #   each block of points only sees a remainder of degree below the block's size; Horner for few points
+    #   See https://cr.yp.to/lineartime/multapps-20080515.pdf section 12
+    def eval_many(self, points, tree=None):
+        if len(self.coeffs) == 0: return [type(x)(0) for x in points]
+        if len(points) < self.multipoint_threshold: return [self.eval(x) for x in points]
+        tree = self.subproduct_tree(points) if tree is None else tree
+        return self.eval_node(tree, points, len(tree) - 1, 0)
+
+    # Values at the points under node (level, index) of the tree, i.e. points[index * 2^level:(index + 1) * 2^level]
+    def eval_node(self, tree, points, level, index):
+        node = tree[level][index]
+        remainder = (self / node)[1] if len(self.coeffs) >= len(node.coeffs) else self
+        block = points[index * 2 ** level:(index + 1) * 2 ** level]
+        if len(remainder.coeffs) == 0: return [type(x)(0) for x in block]
+        if len(block) <= 8: return [remainder.eval(x) for x in block]
+        result = remainder.eval_node(tree, points, level - 1, 2 * index)
+        if 2 * index + 1 < len(tree[level - 1]): result += remainder.eval_node(tree, points, level - 1, 2 * index + 1)
+        return result
+
+    # Levels of the subproduct tree: level 0 holds X - x_i, each level above the pairwise products of the one below
+    #   (an odd node out is carried up unchanged) and the top level holds prod (X - x_i) alone
+    @staticmethod
+    def subproduct_tree(points):
+        field = type(points[0])
+        levels = [[Poly([-x, field(1)]) for x in points]]
+        while len(levels[-1]) > 1:
+            below = levels[-1]
+            levels.append([below[i] * below[i + 1] if i + 1 < len(below) else below[i] for i in range(0, len(below), 2)])
+        return levels
+
+    # The polynomial of degree < len(points) through (points[i], values[i]); the points must be distinct.
+    #   With m = prod (X - x_i), the weights values[i] / m'(x_i) are combined up the subproduct tree as
+    #   r_left * m_right + r_right * m_left, which is Lagrange interpolation with the products shared
+    @staticmethod
+    def interpolate_from(points, values):
+        assert len(points) == len(values) > 0
+        tree = Poly.subproduct_tree(points)
+        denominators = tree[-1][0].derivative().eval_many(points, tree)
+        assert all(x.value != 0 for x in denominators), "interpolation points must be distinct"
+        combined = [Poly([v * w]) for (v, w) in zip(values, type(points[0]).batch_inv(denominators))]
+        for level in range(1, len(tree)):
+            below = tree[level - 1]
+            combined = [combined[i] * below[i + 1] + combined[i + 1] * below[i] if i + 1 < len(below) else combined[i]
+                        for i in range(0, len(below), 2)]
+        return combined[0]
+
+    def derivative(self):
+        return Poly(self.trim_leading_0s([coeff * type(coeff)(index) for (index, coeff) in enumerate(self.coeffs)][1:]))
+
     # This probably wants to live elsewhere
     @staticmethod
     def dot(left, right):
         # assert type(left) == type(right) and len(left.coeffs) == len(right.coeffs)
-        xx = map(lambda x, y: x * y, left, right)
-        return reduce(lambda x, y: x + y, xx)
+        if isinstance(left[0], (Pallas, Vesta)): return msm(left, right)  # Point-by-scalar goes to Pippenger
+        if isinstance(right[0], (Pallas, Vesta)): return msm(right, left)
+        return type(left[0]).sum_of_products(left, right)
 
     @staticmethod
     def trim_leading_0s(coeffs):
@@ -94,6 +212,44 @@ class Poly:
         return coeffs
 
 
+# Evaluation (Lagrange basis) form: values[i] is the polynomial evaluated at domain.elements()[i]
+class Evals:
+    def __init__(self, domain, values):
+        assert isinstance(domain, Domain) and isinstance(values, list) and len(values) == domain.size
+        assert all(type(value) is domain.field for value in values)
+        self.domain = domain
+        self.values = values
+
+    def __repr__(self):
+        values = [x.__repr__() for x in self.values]
+        return f'{self.__class__.__name__} size={self.domain.size} values={values}'
+
+    def __eq__(self, other):
+        assert type(self) == type(other) and self.domain.size == other.domain.size
+        return self.values == other.values
+
+    def __add__(self, other):
+        assert type(self) == type(other) and self.domain is other.domain
+        return Evals(self.domain, [x + y for (x, y) in zip(self.values, other.values)])
+
+    def __sub__(self, other):
+        assert type(self) == type(other) and self.domain is other.domain
+        return Evals(self.domain, [x - y for (x, y) in zip(self.values, other.values)])
+
+    def __mul__(self, other):  # Pointwise product, or scaling by a field element
+        if type(other) is self.domain.field: return Evals(self.domain, [x * other for x in self.values])
+        assert type(self) == type(other) and self.domain is other.domain
+        return Evals(self.domain, [x * y for (x, y) in zip(self.values, other.values)])
+
+    # One inverse NTT (plus a coset rescale) back to coefficient form
+    def interpolate(self):
+        field = self.domain.field
+        coeffs = transform([x.value for x in self.values], field, inverse=True)
+        if self.domain.shift.value != 1:
+            scale_by_powers(coeffs, field, pow(self.domain.shift.value, field.modulus - 2, field.modulus))
+        return Poly(Poly.trim_leading_0s([field.from_reduced(x) for x in coeffs]))
+
+
 if __name__ == "__main__":
     print("Starting quick self-test")
     from random import randint
@@ -113,6 +269,44 @@ if __name__ == "__main__":
         assert (qmul / q1)[0] == q2
         assert (qmul / q2)[0] == q1
 
+    for _i in range(10):
+        p1 = Poly([Fq(randint(0, Fq.modulus - 1)) for _j in range(randint(32, 200))])
+        p2 = Poly([Fq(randint(0, Fq.modulus - 1)) for _k in range(randint(32, 200))])
+        pmul = p1.mul_ntt(p2)
+        assert pmul == p1 * p2
+        x = Fq.rnd()
+        assert pmul.eval(x) == p1.eval(x) * p2.eval(x)
+
+    for _i in range(10):
+        p1 = Poly([Fp(randint(0, Fp.modulus - 1)) for _j in range(randint(64, 300))])
+        p2 = Poly([Fp(randint(0, Fp.modulus - 1)) for _k in range(randint(64, 300))])
+        p3 = p1 * p2 + Poly([Fp(randint(0, Fp.modulus - 1)) for _k in range(randint(1, 63))])
+        assert p3.divmod_newton(p1) == (p2, p3 - p1 * p2)
+        domain = Domain(Fp, randint(1, 128), shift=Fp(randint(0, 1)))
+        vanishing = Poly([-domain.vanishing_constant()] + [Fp(0)] * (domain.size - 1) + [Fp(1)])
+        assert p3.divide_by_vanishing(domain) == p3.divmod_newton(vanishing)
+
+    for shift in [Fp(1), Fp(Fp.n)]:
+        domain = Domain(Fp, 16, shift)
+        p1 = Poly([Fp(randint(0, Fp.modulus - 1)) for _j in range(16)])
+        evals = p1.evaluate_over(domain)
+        assert evals.values == [p1.eval(x) for x in domain.elements()]
+        assert evals.interpolate() == p1
+        p2 = Poly([Fp(randint(0, Fp.modulus - 1)) for _j in range(40)])
+        assert p2.evaluate_over(domain).values == [p2.eval(x) for x in domain.elements()]
+        p3 = Poly([Fp(randint(0, Fp.modulus - 1)) for _j in range(7)])
+        assert (p1.evaluate_over(domain) * p3.evaluate_over(domain)).interpolate() == \
+               (p1 * p3).divide_by_vanishing(domain)[1]
+
+    for size in [1, 5, 63, 64, 150, 300]:
+        points1 = [Fq(randint(0, Fq.modulus - 1)) for _j in range(size)]
+        p1 = Poly([Fq(randint(0, Fq.modulus - 1)) for _j in range(randint(1, 2 * size))])
+        assert p1.eval_many(points1) == [p1.eval(x) for x in points1]
+        p2 = Poly([Fq(randint(0, Fq.modulus - 1)) for _j in range(size)])
+        assert Poly.interpolate_from(points1, p2.eval_many(points1)) == p2
+    assert Poly([]).eval_many([Fp(1), Fp(2)]) == [Fp(0), Fp(0)]
+    assert Poly([Fp(1), Fp(2)]).derivative() == Poly([Fp(2)])
+
     # f(x) = 1 + 2x + 3x^2 + 4x^3; f(5) = 586
     p1 = Poly([Fp(x) for x in [1, 2, 3, 4]])
     assert p1.eval(Fp(5)) == Fp(586)
@@ -1,76 +1,118 @@
 from fields import Fp
-from poly import Poly
+from ntt import Domain
+from poly import Evals, Poly
 
 
 class R1csQap:
 
+    # Gates are stored sparsely: each row (and, after transpose, each column) is a dict of index -> non-zero Fp
     def __init__(self, input_names):
         assert isinstance(input_names, list) and (len(input_names) > 0)
         self.input_names = input_names
+        self.wire_index = {name: index for (index, name) in enumerate(input_names)}
+        assert len(self.wire_index) == len(input_names)
         self.gates = dict()
         self.gates['left'] = []; self.gates['right'] = []; self.gates['out'] = []
         self.samples = dict()
         self.samples['left'] = []; self.samples['right'] = []; self.samples['out'] = []
         self.polys = dict()
         self.polys['left'] = []; self.polys['right'] = []; self.polys['out'] = []
+        self.wire_polys = dict()  # (group, wire index) -> Poly, filled on demand by wire_poly()
         self.t = None; self.h = None; self.z = None
+        self.domain = None  # Gate i is sampled at domain.omega**i; rows beyond the gate count are all zero
 
     def append_gate(self, left_tuple, right_tuple, output_tuple):  # [(name, int value)]
-        left_list = [Fp(0)] * len(self.input_names)
-        right_list = [Fp(0)] * len(self.input_names)
-        output_list = [Fp(0)] * len(self.input_names)
-        for item in left_tuple: left_list[self.input_names.index(item[0])] = Fp(item[1])
-        for item in right_tuple: right_list[self.input_names.index(item[0])] = Fp(item[1])
-        for item in output_tuple: output_list[self.input_names.index(item[0])] = Fp(item[1])
-        self.gates['left'].append(left_list); self.gates['right'].append(right_list); self.gates['out'].append(output_list)
-
+        for (group, items) in [('left', left_tuple), ('right', right_tuple), ('out', output_tuple)]:
+            row = dict()
+            for item in items: row[self.wire_index[item[0]]] = Fp(item[1])
+            self.gates[group].append({index: value for (index, value) in row.items() if value.value != 0})
+
+    # The domain follows the gate count, so it is (re)built whenever gates were appended since it was last set
+    def gen_domain(self):
+        if self.domain is None or self.domain.log_size != (len(self.gates['left']) - 1).bit_length():
+            self.domain = Domain(Fp, len(self.gates['left']))
+            self.wire_polys = dict()
+        return self.domain
+
+    # Column j maps gate index -> coefficient of wire j; O(number of non-zeros). New columns invalidate the cached
+    #   wire polynomials even when the domain size is unchanged
     def transpose(self):
+        self.gen_domain()
+        self.wire_polys = dict()
         for matrix in ['left', 'right', 'out']:
-            rows = len(self.gates['left'])
-            columns = len(self.gates['left'][0])
-            result = []
-            for j in range(columns):
-                row = []
-                for i in range(rows):
-                    row.append(self.gates[matrix][i][j])
-                result.append(row)
+            result = [dict() for _j in range(len(self.input_names))]
+            for (i, row) in enumerate(self.gates[matrix]):
+                for (j, value) in row.items():
+                    result[j][i] = value
             self.samples[matrix] = result
 
+    # Interpolates a column over the domain with one inverse NTT; samples are zero-padded to the domain size
     @staticmethod
-    def poly_interp(samples):
-        result = Poly([Fp(0)])
-        for (sample_index, value) in enumerate(samples):
-            terms = Poly([Fp(1)])
-            if value == Fp(0): continue
-            zero_indices = [x for x in range(len(samples))]
-            zero_indices.remove(sample_index)
-            for zero_index in zero_indices:
-                terms = terms * Poly([Fp(-(zero_index + 1)), Fp(1)])  # X - index (starting at one)
-            scale = terms.eval(Fp(sample_index + 1))
-            addd = Poly([value]) * (terms / Poly([scale]))[0]
-            result = result + addd
-        return result
+    def poly_interp(samples, domain):
+        assert len(samples) <= domain.size
+        return Evals(domain, samples + [Fp(0)] * (domain.size - len(samples))).interpolate()
 
+    # Columns with only a few non-zeros skip the NTT: the Lagrange polynomial for omega**i has coefficients
+    #   omega**(-i*k) / n, so each non-zero adds one geometric sequence
+    @staticmethod
+    def sparse_interp(column, domain):
+        modulus = Fp.modulus
+        coeffs = [0] * domain.size
+        omega_inv = domain.omega.inv0().value
+        size_inv = pow(domain.size, modulus - 2, modulus)
+        for (row, value) in column.items():
+            term, step = value.value * size_inv % modulus, pow(omega_inv, row, modulus)
+            for k in range(domain.size):
+                coeffs[k] += term
+                term = term * step % modulus
+        return Poly(Poly.trim_leading_0s([Fp(x) for x in coeffs]))
+
+    # Coefficient form of one wire's column, computed on first use and cached. A column's polynomial is dense
+    #   (n coefficients) even for a single non-zero, so only wires that are actually needed should be interpolated;
+    #   the columns themselves (self.samples, after transpose()) are the sparse evaluation form
+    def wire_poly(self, group, wire):
+        domain = self.gen_domain()
+        if (group, wire) not in self.wire_polys:
+            column = self.samples[group][wire]
+            if len(column) == 0:  # Wire unused by this group
+                poly = Poly([])
+            elif len(column) < domain.log_size:
+                poly = self.sparse_interp(column, domain)
+            else:
+                samples = [Fp(0)] * len(self.gates['left'])
+                for (row, value) in column.items(): samples[row] = value
+                poly = self.poly_interp(samples, domain)
+            self.wire_polys[(group, wire)] = poly
+        return self.wire_polys[(group, wire)]
+
+    # Every wire's polynomial: O(n * used wires) time and memory, so this is for inspection and small circuits;
+    #   the prover (gen_t(), gen_z(), gen_h()) works from the sparse rows alone and never needs it
     def gen_polys(self):
         for group in ['left', 'right', 'out']:
-            for samples in self.samples[group]:
-                res_poly = self.poly_interp(samples)
-                self.polys[group].append(res_poly)
+            self.polys[group] = [self.wire_poly(group, wire) for wire in range(len(self.samples[group]))]
 
+    # The witness combinations A, B, C are formed from the sparse rows in evaluation form, then A * B - C
+    #   (degree < 2n) is formed pointwise on a domain of twice the size and interpolated once; O(nnz + n log n)
     def gen_t(self, soln):
+        assert len(soln) == len(self.input_names)
+        self.gen_domain()
+        wide = Domain(Fp, 2 * self.domain.size)
         dots = dict()
         for group in ['left', 'right', 'out']:
-            xxx = Poly([Fp(0)])
-            for index in range(len(soln)):
-                xxx = xxx + self.polys[group][index] * Poly([soln[index]])
-            dots[group] = xxx
-        self.t = (dots['left'] * dots['right']) - dots['out']
+            values = [Fp.sum_of_products(list(gate.values()), [soln[index] for index in gate])
+                      for gate in self.gates[group]]
+            values += [Fp(0)] * (self.domain.size - len(values))
+            dots[group] = Evals(self.domain, values).interpolate().evaluate_over(wide)
+        self.t = ((dots['left'] * dots['right']) - dots['out']).interpolate()
 
     def gen_z(self):
-        z = Poly([Fp(1)])
-        for index in range(1, 5):
-            z = z * Poly([Fp(-index), Fp(1)])
-        self.z = z
+        self.gen_domain()
+        self.z = Poly([Fp(-1)] + [Fp(0)] * (self.domain.size - 1) + [Fp(1)])  # X^n - 1 vanishes on the domain
+
+    def gen_h(self):
+        self.gen_domain()
+        self.h, remainder = self.t.divide_by_vanishing(self.domain)
+        assert remainder == Poly([])  # Holds exactly when the solution satisfies every gate
 
 
 if __name__ == '__main__':
@@ -81,9 +123,10 @@ if __name__ == '__main__':
     gates.append_gate([('x', 1), ('y', 1)], [('one', 1)], [('sym_2', 1)])
     gates.append_gate([('one', 5), ('sym_2', 1)], [('one', 1)], [('out', 1)])    # PRINT
 
-    for gate in gates.gates['left']: print(f'A gate {gate}')
-    for gate in gates.gates['right']: print(f'B gate {gate}')
-    for gate in gates.gates['out']: print(f'C gate {gate}')
+    names = gates.input_names
+    for gate in gates.gates['left']: print(f'A gate {[(names[j], v) for (j, v) in gate.items()]}')
+    for gate in gates.gates['right']: print(f'B gate {[(names[j], v) for (j, v) in gate.items()]}')
+    for gate in gates.gates['out']: print(f'C gate {[(names[j], v) for (j, v) in gate.items()]}')
 
     gates.transpose()
 
@@ -97,9 +140,42 @@ if __name__ == '__main__':
     for poly in gates.polys['right']: print(f'B poly {poly}')
     for poly in gates.polys['out']: print(f'C poly {poly}')
 
+    for (group, columns) in gates.samples.items():
+        for (column, poly) in zip(columns, gates.polys[group]):
+            dense = [column.get(row, Fp(0)) for row in range(gates.domain.size)]
+            assert poly == gates.poly_interp(dense, gates.domain)
+            assert poly == gates.sparse_interp(column, gates.domain)
+
     soln1 = [Fp(1), Fp(3), Fp(35), Fp(9), Fp(27), Fp(30)]
     gates.gen_t(soln1)
 
     gates.gen_z()
-
-    print(" h is ", gates.t / gates. z)
+    gates.gen_h()
+
+    print(" h is ", gates.h)
+    assert gates.t / gates.z == (gates.h, Poly([]))
+
+    # The prover path needs neither transpose() nor gen_polys(): a chain of squarings w_(i+1) = w_i * w_i
+    chain = R1csQap(['one'] + [f'w{i}' for i in range(101)])
+    for i in range(100): chain.append_gate([(f'w{i}', 1)], [(f'w{i}', 1)], [(f'w{i + 1}', 1)])
+    soln2 = [Fp(1), Fp(2)]
+    for _i in range(100): soln2.append(soln2[-1] * soln2[-1])
+    chain.gen_t(soln2)
+    chain.gen_z()
+    chain.gen_h()
+    assert chain.domain.size == 128 and chain.t == chain.h * chain.z
+    chain.transpose()
+    assert chain.wire_poly('left', 5) == chain.sparse_interp(chain.samples['left'][5], chain.domain)
+    assert chain.wire_poly('out', 0) == Poly([]) and len(chain.wire_polys) == 2
+
+    # Appending a gate within the same domain size and transposing again must not serve stale wire polynomials
+    small = R1csQap(['one', 'x', 'y'])
+    for _i in range(3): small.append_gate([('x', 1)], [('x', 1)], [('y', 1)])
+    small.transpose()
+    stale = small.wire_poly('left', 1)
+    small.append_gate([('x', 7)], [('one', 1)], [('y', 1)])
+    small.transpose()
+    assert small.domain.size == 4 and small.wire_poly('left', 1) != stale
+    assert small.wire_poly('left', 1) == small.poly_interp([Fp(1), Fp(1), Fp(1), Fp(7)], small.domain)
+
+    print("Success.")
@@ -0,0 +1,86 @@
+# This code implements a Fiat-Shamir transcript over BLAKE2b: the prover and verifier absorb the same messages in
+#   the same order, and each challenge is squeezed from (a copy of) the running hash state
+
+from functools import lru_cache
+from hashlib import blake2b
+
+from curves import Pallas, Vesta
+from fields import Fp, Fq
+
+PERSONALIZATION = b'zero11_transcrpt'  # 16 bytes, the BLAKE2b maximum
+
+
+# The state after absorbing the protocol label; each new transcript copies it rather than re-hashing the label
+@lru_cache(maxsize=None)
+def initial_state(label):
+    state = blake2b(digest_size=64, person=PERSONALIZATION)
+    state.update(len(label).to_bytes(8, byteorder='little') + label)
+    return state
+
+
+class Transcript:
+    def __init__(self, label, state=None):
+        self.label = label
+        self.state = initial_state(label).copy() if state is None else state
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} label={self.label} state={self.state.hexdigest()[0:16]}...'
+
+    # An independent transcript with the same history, e.g. to verify a proof without disturbing the original
+    def copy(self):
+        return Transcript(self.label, self.state.copy())
+
+    # Every message is framed as length-prefixed label, then length-prefixed data, so no two histories collide
+    def append(self, label, data):
+        self.state.update(len(label).to_bytes(8, byteorder='little') + label +
+                          len(data).to_bytes(8, byteorder='little') + data)
+
+    def append_point(self, label, point):
+        assert isinstance(point, (Pallas, Vesta))
+        self.append(label, point.to_bytes())
+
+    def append_points(self, label, points):
+        self.append(label, type(points[0]).encode_many(points) if points else b'')
+
+    def append_scalar(self, label, scalar):
+        assert isinstance(scalar, (Fp, Fq))
+        self.append(label, scalar.value.to_bytes(32, byteorder='little'))
+
+    # 64 squeezed bytes reduced into the field (bias about 2^-256); the output is absorbed back so the next
+    #   challenge differs even if nothing else is appended in between
+    def challenge_scalar(self, label, field):
+        self.append(b'challenge', label)
+        digest = self.state.copy().digest()
+        self.state.update(digest)
+        return field(int.from_bytes(digest, byteorder='little'))
+
+    # A point with unknown discrete log, hashed to the curve from a squeezed digest
+    def challenge_point(self, label, curve):
+        self.append(b'challenge_point', label)
+        digest = self.state.copy().digest()
+        self.state.update(digest)
+        return curve.hash_to_curve(digest, domain_prefix=self.label)
+
+
+if __name__ == '__main__':
+    print("Starting transcript.py quick self-test")
+
+    t1 = Transcript(b'zero11-test')
+    t1.append_point(b'P', Pallas.base())
+    t1.append_scalar(b'x', Fq(7))
+    t2 = t1.copy()
+    u1, u2 = t1.challenge_scalar(b'u', Fq), t2.challenge_scalar(b'u', Fq)
+    assert u1 == u2 and t1.challenge_scalar(b'u', Fq) != u1 and t2.challenge_scalar(b'u', Fq) != u2
+    assert t1.challenge_point(b'U', Pallas) == t2.challenge_point(b'U', Pallas)
+    assert t2.copy().challenge_scalar(b'v', Fq) == t2.challenge_scalar(b'v', Fq)
+    t3 = Transcript(b'zero11-test')
+    t3.append_point(b'P', Pallas.base())
+    t3.append_scalar(b'x', Fq(8))
+    assert t3.challenge_scalar(b'u', Fq) != u1
+    assert Transcript(b'zero11-other').challenge_scalar(b'u', Fq) != Transcript(b'zero11-test').challenge_scalar(b'u', Fq)
+    t4, t5 = Transcript(b'zero11-test'), Transcript(b'zero11-test')
+    t4.append_points(b'L', [Pallas.base(), Pallas.base().double()])
+    t5.append_point(b'L', Pallas.base())
+    assert t4.challenge_point(b'U', Pallas) != t5.challenge_point(b'U', Pallas)
+
+    print("Success.")